@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+"""
+Compare copying nrr data between HDF5 datasets by decompressing and
+recompressing it, as a store update does, to copying the compressed chunks
+directly.
+
+The datasets are chunked like the time storages of a source and a target
+store of a group in nrr-init, spanning the full nrr grid, and use the
+compression options of the nrr stores. Compressed chunks can only be copied
+as they are if the layouts of both datasets match; otherwise only the
+recompression is timed. Both copies are checked to yield the same data.
+"""
+
+from os.path import join
+
+import argparse
+import statistics
+import tempfile
+import time
+
+import h5py
+import numpy as np
+
+from raster_feeder.nrr.init import DEPTHS
+from raster_feeder.nrr.init import KWARGS
+
+SHAPE = 490, 500
+NODATAVALUE = -9999
+
+
+def get_options(depth):
+    """ Return dataset creation keyword arguments for a chunk depth. """
+    return dict(chunks=(depth,) + SHAPE,
+                dtype=KWARGS['dtype'],
+                fillvalue=NODATAVALUE,
+                **KWARGS['h5opts'])
+
+
+def get_layout(dataset):
+    """ Return tuple of the properties that determine its chunks' bytes. """
+    return (dataset.chunks,
+            dataset.dtype,
+            dataset.compression,
+            dataset.compression_opts,
+            dataset.scaleoffset,
+            dataset.shuffle,
+            dataset.fillvalue)
+
+
+def create_source(path, depth, bands):
+    """ Create a dataset with some rain-like data and return its path. """
+    random = np.random.RandomState(0)
+    with h5py.File(path, 'w') as h5:
+        dataset = h5.create_dataset(
+            'data', shape=(bands,) + SHAPE, **get_options(depth)
+        )
+        for start in range(0, bands, depth):
+            shape = (min(depth, bands - start),) + SHAPE
+            data = np.full(shape, NODATAVALUE, dtype=KWARGS['dtype'])
+            rain = random.gamma(0.5, 2, size=shape).astype(KWARGS['dtype'])
+            wet = random.rand(*shape) < 0.3
+            data[wet] = rain[wet]
+            dataset[start:start + shape[0]] = data
+    return path
+
+
+def recompress(source, target):
+    """ Copy target chunk by target chunk via decompressed data. """
+    for selection in target.iter_chunks():
+        target[selection] = source[selection]
+
+
+def direct(source, target):
+    """ Copy the compressed chunks as they are. """
+    for selection in source.iter_chunks():
+        offsets = tuple(s.start for s in selection)
+        filter_mask, chunk = source.id.read_direct_chunk(offsets)
+        target.id.write_direct_chunk(offsets, chunk, filter_mask)
+
+
+def measure(func, source_path, target_path, depth, repeat):
+    """ Return median seconds of copying with func, and the copied data. """
+    timings = []
+    for _ in range(repeat):
+        with h5py.File(source_path, 'r') as source_h5:
+            source = source_h5['data']
+            with h5py.File(target_path, 'w') as target_h5:
+                target = target_h5.create_dataset(
+                    'data', shape=source.shape, **get_options(depth)
+                )
+                start = time.perf_counter()
+                func(source, target)
+                target_h5.flush()
+                timings.append(time.perf_counter() - start)
+    with h5py.File(target_path, 'r') as target_h5:
+        data = target_h5['data'][:]
+    return statistics.median(timings), data
+
+
+def benchmark(group, source, target, chunks, repeat):
+    """ Print timings for the ways of copying that the layouts allow. """
+    source_depth = DEPTHS[group][source][1]
+    target_depth = DEPTHS[group][target][1]
+    bands = max(source_depth, target_depth) * chunks
+    with tempfile.TemporaryDirectory() as tmp:
+        source_path = create_source(
+            join(tmp, 'source.h5'), source_depth, bands,
+        )
+        target_path = join(tmp, 'target.h5')
+        print('{} bands of {}x{} from {}/{} (depth {}) to {}/{} (depth {})'
+              .format(bands, *SHAPE, group, source, source_depth,
+                      group, target, target_depth))
+
+        # compare the layouts as the files have them
+        with h5py.File(source_path, 'r') as source_h5, \
+                h5py.File(target_path, 'w') as target_h5:
+            layouts = (get_layout(source_h5['data']),
+                       get_layout(target_h5.create_dataset(
+                           'data', shape=(bands,) + SHAPE,
+                           **get_options(target_depth)
+                       )))
+        funcs = [recompress]
+        if layouts[0] == layouts[1]:
+            funcs.append(direct)
+        else:
+            print('layouts differ, compressed chunks cannot be copied')
+
+        results = {}
+        for func in funcs:
+            seconds, results[func] = measure(
+                func, source_path, target_path, target_depth, repeat,
+            )
+            print('{:12} {:8.3f} s {:8.1f} bands/s'.format(
+                func.__name__, seconds, bands / seconds,
+            ))
+        if direct in results:
+            identical = np.array_equal(results[recompress], results[direct])
+            print('identical: {}'.format(identical))
+
+
+def get_parser():
+    """ Return argument parser. """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '-g', '--group',
+        choices=sorted(DEPTHS),
+        default='5min',
+        help='Group of the stores to take the chunk depths from.',
+    )
+    parser.add_argument(
+        '-s', '--source',
+        default='ultimate',
+        help='Store to copy from.',
+    )
+    parser.add_argument(
+        '-t', '--target',
+        default='merge',
+        help='Store to copy to.',
+    )
+    parser.add_argument(
+        '-c', '--chunks',
+        type=int,
+        default=1,
+        help='Number of chunks of the deepest store to copy.',
+    )
+    parser.add_argument(
+        '-r', '--repeat',
+        type=int,
+        default=3,
+        help='Number of runs to take the median from.',
+    )
+    return parser
+
+
+def main():
+    """ Call benchmark with args from parser. """
+    benchmark(**vars(get_parser().parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+"""
+Measure the startup time of the raster-feeder console scripts.
+
+For every entry point two things are timed in a fresh interpreter: a call
+with '--help' and a no-op run, that is everything a real run does before the
+actual work starts (importing the command module and initializing gdal, the
+raster store cache and sentry). The package needs to be installed.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+import pkg_resources
+
+HELP = """
+import sys
+from {module} import {attr} as main
+sys.argv = ['{name}', '--help']
+try:
+    main()
+except SystemExit:
+    pass
+"""
+
+NOOP = """
+import {module}
+import raster_feeder
+raster_feeder.setup(stores={stores})
+"""
+
+# scripts that do not access any raster stores
+STORELESS = {'touch-lizard'}
+
+
+def get_entry_points():
+    """ Return sorted list of raster-feeder console script entry points. """
+    distribution = pkg_resources.get_distribution('raster_feeder')
+    entry_map = distribution.get_entry_map('console_scripts')
+    return sorted(entry_map.values(), key=lambda e: e.name)
+
+
+def measure(code, repeat):
+    """ Return median wall time in seconds of running code in python. """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, '-c', code],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def benchmark(repeat):
+    """ Print a table with startup timings per entry point. """
+    baseline = measure('pass', repeat)
+    template = '{:26} {:>8} {:>8}'
+    print(template.format('entry point', 'help', 'no-op'))
+    print(template.format('(interpreter)', '%.3f' % baseline, ''))
+    for entry_point in get_entry_points():
+        fields = {
+            'name': entry_point.name,
+            'module': entry_point.module_name,
+            'attr': entry_point.attrs[0],
+            'stores': entry_point.name not in STORELESS,
+        }
+        help_time = measure(HELP.format(**fields), repeat)
+        noop_time = measure(NOOP.format(**fields), repeat)
+        print(template.format(
+            entry_point.name, '%.3f' % help_time, '%.3f' % noop_time,
+        ))
+
+
+def get_parser():
+    """ Return argument parser. """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '-r', '--repeat',
+        type=int,
+        default=5,
+        help='Number of runs to take the median from.',
+    )
+    return parser
+
+
+def main():
+    """ Call benchmark with args from parser. """
+    benchmark(**vars(get_parser().parse_args()))
+
+
+if __name__ == '__main__':
+    main()
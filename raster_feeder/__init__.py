@@ -1,26 +1,42 @@
 # -*- coding: utf-8 -*-
 # (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
 
-from osgeo import gdal
-from osgeo import osr
-import redis
-import sentry_sdk
+from . import config
 
-from raster_store import cache
+INITIALIZED = set()
 
-from . import config
 
-# crash on gdal exceptions
-gdal.UseExceptions()
-osr.UseExceptions()
+def setup(stores=True):
+    """
+    Initialize sentry and, if stores is True, gdal and the raster store cache.
+
+    The imports are done here instead of at module level, so that commands
+    only pay for the dependencies they actually use. Calling this more than
+    once has no effect.
+    """
+    # sentry
+    if config.SENTRY_DSN and 'sentry' not in INITIALIZED:
+        import sentry_sdk
+        sentry_sdk.init(config.SENTRY_DSN)
+    INITIALIZED.add('sentry')
+
+    if not stores or 'stores' in INITIALIZED:
+        return
+
+    from osgeo import gdal
+    from osgeo import osr
+    import redis
+
+    from raster_store import cache
 
-# use one cache client for all raster store operations
-cache.client = redis.Redis(
-    host=config.REDIS_HOST,
-    db=config.REDIS_DB,
-    password=config.REDIS_PASSWORD
-)
+    # crash on gdal exceptions
+    gdal.UseExceptions()
+    osr.UseExceptions()
 
-# sentry
-if config.SENTRY_DSN:
-    sentry_sdk.init(config.SENTRY_DSN)
+    # use one cache client for all raster store operations
+    cache.client = redis.Redis(
+        host=config.REDIS_HOST,
+        db=config.REDIS_DB,
+        password=config.REDIS_PASSWORD
+    )
+    INITIALIZED.add('stores')
@@ -11,6 +11,7 @@ import os
 from datetime import timedelta as Timedelta
 
 from . import config
+from .. import setup
 from ..common import create_tumbler
 
 
@@ -37,4 +38,5 @@ def get_parser():
 def main():
     """ Call command with args from parser. """
     get_parser().parse_args()
+    setup()
     init_alarmtester()
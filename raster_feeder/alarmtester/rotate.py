@@ -17,18 +17,18 @@ import numpy as np
 from osgeo import osr
 from raster_store import regions
 
-from ..common import rotate, touch_lizard
+from ..common import Pipeline, Stage, rotate, touch_lizard
 from . import config
+from .. import setup
 
 logger = logging.getLogger(__name__)
 
 
-def rotate_alarmtester():
+def get_region(now):
     """
-    Rotate alarm tester stores.
+    Return alarm tester region for a datetime.
     """
     # obtain origin two hours before now and rounded to 5 minutes
-    now = Datetime.utcnow()
     origin = now - Timedelta(hours=2, minutes=now.minute % 5,
                              seconds=now.second, microseconds=now.microsecond)
 
@@ -42,7 +42,7 @@ def rotate_alarmtester():
     data = np.empty((config.DEPTH, 2, 4), dtype='f4')
     data[:] = values[:, np.newaxis, np.newaxis]
 
-    region = regions.Region.from_mem(
+    return regions.Region.from_mem(
         time=time,
         bands=(0, config.DEPTH),
         fillvalue=np.finfo('f4').max.item(),
@@ -51,9 +51,23 @@ def rotate_alarmtester():
         geo_transform=config.GEO_TRANSFORM,
     )
 
-    # rotate the stores
+
+def rotate_region(region):
+    """ Rotate the stores using region. """
     path = os.path.join(config.STORE_DIR, config.NAME)
     rotate(path=path, region=region, resource=config.NAME)
+    return config.NAME
+
+
+def rotate_alarmtester():
+    """
+    Rotate alarm tester stores.
+    """
+    pipeline = Pipeline(
+        Stage(name='build', func=get_region),
+        Stage(name='rotate', func=rotate_region),
+    )
+    pipeline.run([Datetime.utcnow()])
 
     # touch lizard
     for raster_uuid in config.TOUCH_LIZARD:
@@ -76,6 +90,7 @@ def main():
     """ Call command with args from parser. """
     # logging
     kwargs = vars(get_parser().parse_args())
+    setup()
     if kwargs.pop('verbose'):
         logging.basicConfig(**{
             'stream': sys.stderr,
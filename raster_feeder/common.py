@@ -11,20 +11,24 @@ import os
 
 import ftplib
 import io
+import queue
 import re
-import requests
-import turn
-import urllib3
-
-from raster_store import load
-from raster_store import stores
-from dask_geomodeling.raster import Group
-from raster_store.blocks import RasterStoreSource
+import threading
+import time
 
 from . import config
 
 logger = logging.getLogger(__name__)
-locker = turn.Locker(host=config.REDIS_HOST_TURN)
+locker = None  # created by get_locker()
+
+
+def get_locker():
+    """ Return the turn locker shared in this process. """
+    global locker
+    if locker is None:
+        import turn
+        locker = turn.Locker(host=config.REDIS_HOST_TURN)
+    return locker
 
 
 def create_tumbler(path, depth, average=False, **kwargs):
@@ -41,6 +45,10 @@ def create_tumbler(path, depth, average=False, **kwargs):
 
 
     """
+    from raster_store import stores
+    from dask_geomodeling.raster import Group
+    from raster_store.blocks import RasterStoreSource
+
     if not exists(path):
         os.mkdir(path)
 
@@ -100,9 +108,11 @@ def rotate(path, region, resource, label='rotate'):
     rotation, because data is loaded in one store and the other is
     cleared.
     """
+    from raster_store import load
+
     logger.info('Rotation of %s started.' % resource)
 
-    with locker.lock(resource=resource, label='rotate'):
+    with get_locker().lock(resource=resource, label='rotate'):
         # load the stores
         old = load(join(path, basename(path) + '1'))
         new = load(join(path, basename(path) + '2'))
@@ -149,6 +159,9 @@ def get_requests_session(retries=3, backoff_factor=1):
 
     Copied from lizard.
     """
+    import requests
+    import urllib3
+
     session = requests.Session()
     retry = urllib3.util.retry.Retry(retries, backoff_factor=backoff_factor)
     adapter = requests.adapters.HTTPAdapter(max_retries=retry)
@@ -183,6 +196,121 @@ def touch_lizard(raster_uuid):
         )
 
 
+class Stage(object):
+    """
+    A step in a feeder pipeline, applying a function to incoming items.
+
+    :param name: Name of the stage, used for logging
+    :param func: Callable to apply to each item
+    :param expand: If True, func returns an iterable of items instead
+
+    A func returning None drops the item from the pipeline. Time spent in
+    func is accumulated per stage.
+    """
+    def __init__(self, name, func, expand=False):
+        self.name = name
+        self.func = func
+        self.expand = expand
+        self.count = 0
+        self.elapsed = 0.
+
+    def _timed(self, func, *args):
+        start = time.monotonic()
+        try:
+            return func(*args)
+        finally:
+            self.elapsed += time.monotonic() - start
+
+    def apply(self, item):
+        """ Return generator of results for item. """
+        self.count += 1
+        result = self._timed(self.func, item)
+        if result is None:
+            return
+        if not self.expand:
+            yield result
+            return
+        iterator = self._timed(iter, result)
+        while True:
+            try:
+                yield self._timed(next, iterator)
+            except StopIteration:
+                return
+
+
+class Pipeline(object):
+    """
+    Run stages in separate threads, connected by bounded queues.
+
+    :param stages: Stage instances, in order
+    :param maxsize: Maximum number of items waiting between two stages
+
+    Because every stage has its own thread, the retrieval of the next item
+    overlaps with the decoding of the current one, and so on.
+    """
+    SENTINEL = object()
+
+    def __init__(self, *stages, maxsize=1):
+        self.stages = stages
+        self.maxsize = maxsize
+
+    def _work(self, stage, source, target, errors):
+        """ Feed results from stage to target until source is exhausted. """
+        for item in iter(source.get, self.SENTINEL):
+            if errors:
+                continue  # keep draining to not block upstream stages
+            try:
+                for result in stage.apply(item):
+                    target.put(result)
+            except Exception as error:
+                logger.exception('Error in stage %s.', stage.name)
+                errors.append(error)
+        target.put(self.SENTINEL)
+
+    def run(self, items):
+        """
+        Return list of results from the last stage.
+
+        :param items: Iterable of items to feed to the first stage.
+
+        An exception raised by any stage is reraised here after all stages
+        have finished.
+        """
+        errors = []
+        queues = [queue.Queue(self.maxsize) for stage in self.stages]
+        queues.append(queue.Queue())  # the results are not bounded
+        threads = [
+            threading.Thread(
+                target=self._work,
+                args=(stage, source, target, errors),
+                daemon=True,
+            )
+            for stage, source, target in zip(
+                self.stages, queues[:-1], queues[1:],
+            )
+        ]
+        for thread in threads:
+            thread.start()
+
+        for item in items:
+            queues[0].put(item)
+        queues[0].put(self.SENTINEL)
+        results = list(iter(queues[-1].get, self.SENTINEL))
+
+        for thread in threads:
+            thread.join()
+        for stage in self.stages:
+            logger.info(
+                'Stage %s processed %d item(s) in %.2f s.',
+                stage.name,
+                stage.count,
+                stage.elapsed,
+            )
+        if errors:
+            raise errors[0]
+        return results
+
+
 class FTPServer(object):
     def __init__(self, host, user=None, password=None, path=None):
         """ Connects and switches to  """
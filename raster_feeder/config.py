@@ -29,6 +29,9 @@ LIZARD_USERNAME = 'override'
 LIZARD_PASSWORD = 'override'
 LIZARD_TEMPLATE = 'override'
 
+# jobs for the raster-feeder-scheduler, see raster_feeder.scheduler
+SCHEDULE = []
+
 # sentry
 SENTRY_DSN = None  # put in localconfig: 'https://<key>@sentry.io/<project>'
 
@@ -23,8 +23,9 @@ from osgeo import osr
 from raster_store import load
 from raster_store import regions
 
-from ..common import rotate, touch_lizard
+from ..common import Pipeline, Stage, rotate, touch_lizard
 from . import config
+from .. import setup
 
 logger = logging.getLogger(__name__)
 
@@ -260,21 +261,33 @@ def rotate_harmonie():
         logger.info('No update available, exiting.')
         return
 
-    # download and process the file
-    try:
-        logger.info('Retrieving: %s', latest['filename'])
-        fileobj = io.BytesIO(dataset.retrieve(latest['filename']))
-    except Exception:
-        logger.exception('Error retrieving {}'.format(latest))
-        return
-
-    # extract regions
-    regions = extract_regions(fileobj)
-
-    # rotate the stores
-    for name, region in regions.items():
+    def fetch(filename):
+        """ Return file object with downloaded data or None. """
+        try:
+            logger.info('Retrieving: %s', filename)
+            return io.BytesIO(dataset.retrieve(filename))
+        except Exception:
+            logger.exception('Error retrieving {}'.format(latest))
+
+    def rotate_region(item):
+        """ Rotate the stores for a (name, region) tuple. """
+        name, region = item
         path = join(config.STORE_DIR, name)
         rotate(path=path, region=region, resource=name)
+        return name
+
+    # download, extract regions and rotate the stores
+    pipeline = Pipeline(
+        Stage(name='fetch', func=fetch),
+        Stage(
+            name='decode',
+            func=lambda fileobj: extract_regions(fileobj).items(),
+            expand=True,
+        ),
+        Stage(name='rotate', func=rotate_region),
+    )
+    if not pipeline.run([latest['filename']]):
+        return
 
     # touch lizard
     for raster_uuid in config.TOUCH_LIZARD:
@@ -297,6 +310,7 @@ def main():
     """ Call command with args from parser. """
     # logging
     kwargs = vars(get_parser().parse_args())
+    setup()
     if kwargs.pop('verbose'):
         logging.basicConfig(**{
             'stream': sys.stderr,
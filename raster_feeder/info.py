@@ -5,8 +5,7 @@ from os.path import basename
 import argparse
 import logging
 
-from raster_store import load
-from dask_geomodeling.raster import Group
+from . import setup
 
 logger = logging.getLogger(__name__)
 
@@ -46,6 +45,9 @@ def summary(group):
 
 def blockinfo(path):
     """ Show store representation. """
+    from raster_store import load
+    from dask_geomodeling.raster import Group
+
     geoblock = load(path, cold=True)
     if isinstance(geoblock, Group):
         print(summary(geoblock))
@@ -55,4 +57,6 @@ def blockinfo(path):
 
 def main():
     """ Call blockinfo with args from parser. """
-    return blockinfo(**vars(get_parser().parse_args()))
+    kwargs = vars(get_parser().parse_args())
+    setup()
+    return blockinfo(**kwargs)
@@ -11,6 +11,7 @@ from os.path import join
 import argparse
 
 from . import config
+from .. import setup
 from ..common import create_tumbler
 
 
@@ -39,4 +40,5 @@ def get_parser():
 def main():
     """ Call command with args from parser. """
     get_parser().parse_args()
+    setup()
     init_nowcast()
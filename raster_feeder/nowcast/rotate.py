@@ -20,9 +20,12 @@ import numpy as np
 
 from raster_store import regions
 
+from ..common import Pipeline
+from ..common import Stage
 from ..common import rotate
 from ..common import touch_lizard
 from . import config
+from .. import setup
 
 logger = logging.getLogger(__name__)
 
@@ -52,9 +55,17 @@ def fetch_latest_nowcast_h5():
     return target_path
 
 
-def get_nowcast_region():
+def fetch(item):
+    """ Return path to downloaded nowcastfile or None. """
+    try:
+        return fetch_latest_nowcast_h5()
+    except Exception:
+        logger.exception('Error getting the nowcast data.')
+
+
+def get_nowcast_region(path):
     """
-    Get latest nowcast image as region.
+    Get nowcast image from downloaded path as region.
     """
     # prepare
     geo_transform = config.GEO_TRANSFORM
@@ -62,8 +73,6 @@ def get_nowcast_region():
     fmt = 'RAD_TF0005_R_PROG_%Y%m%d%H%M%S'
     fillvalue = np.finfo('f4').max.item()
     now = Datetime.now().isoformat()
-    # download
-    path = fetch_latest_nowcast_h5()
     logger.debug('Received nowcastfile {}'.format(path))
     # read
     with h5py.File(path, 'r') as h5:
@@ -79,7 +88,6 @@ def get_nowcast_region():
             name = h5[image].attrs['image_product_name'].decode('ascii')
             meta.append(json.dumps({'product': name, 'stored': now}))
             time.append(Datetime.strptime(name, fmt))
-    shutil.rmtree(dirname(path))
 
     # retrun as region
     return regions.Region.from_mem(
@@ -93,21 +101,35 @@ def get_nowcast_region():
     )
 
 
-def rotate_nowcast():
-    """
-    Rotate nowcast stores.
-    """
-    # retrieve updated data
+def extract(path):
+    """ Return region from downloaded path or None. """
     try:
-        region = get_nowcast_region()
+        return get_nowcast_region(path)
     except Exception:
         logger.exception('Error getting the nowcast data.')
-        return
+    finally:
+        shutil.rmtree(dirname(path))
 
-    # rotate the stores
+
+def rotate_region(region):
+    """ Rotate the stores using region. """
     name = config.NAME
     path = join(config.STORE_DIR, name)
     rotate(path=path, region=region, resource=name)
+    return name
+
+
+def rotate_nowcast():
+    """
+    Rotate nowcast stores.
+    """
+    pipeline = Pipeline(
+        Stage(name='fetch', func=fetch),
+        Stage(name='decode', func=extract),
+        Stage(name='rotate', func=rotate_region),
+    )
+    if not pipeline.run([None]):
+        return
 
     # touch lizard
     for raster_uuid in config.TOUCH_LIZARD:
@@ -130,6 +152,7 @@ def main():
     """ Call command with args from parser. """
     # logging
     kwargs = vars(get_parser().parse_args())
+    setup()
     if kwargs.pop('verbose'):
         logging.basicConfig(**{
             'stream': sys.stderr,
@@ -17,6 +17,17 @@ from ..config import REDIS_PASSWORD  # NOQA
 from ..config import REDIS_HOST  # NOQA
 from ..config import REDIS_DB  # NOQA
 
+# Seconds to trust the mtime cache before looking at a product file again.
+# A product that is delivered again under the same path is only picked up by
+# nrr-store scans once its record expired, so keep this well below the time
+# in which products get re-delivered; nrr-watch stores arrivals directly.
+MTIME_CACHE_TTL = 10 * 60
+
+# Number of chunks of group meta to cache in memory, and seconds to keep them
+# in redis, too (None for memory only)
+META_CACHE_SIZE = 64
+META_CACHE_TTL = 3600
+
 # Redis for turn
 from ..config import REDIS_HOST_TURN  # NOQA
 
@@ -24,6 +35,9 @@ from ..config import REDIS_HOST_TURN  # NOQA
 CALIBRATE_DIR = PACKAGE_DIR / "var" / "calibrate"
 CONSISTENT_DIR = PACKAGE_DIR / "var" / "consistent"
 
+# journals of nrr-move are kept here
+JOURNAL_DIR = PACKAGE_DIR / "var" / "journal"
+
 # Default nodatavalue
 NODATAVALUE = -9999
 
@@ -41,6 +55,39 @@ PRODUCT_CODE = {t: {p: 'TF{}_{}'.format(FRAMESTAMP[t], p.upper())
                 for t in 'fhd'}
 PRODUCT_TEMPLATE = 'RAD_{code}_{timestamp}.h5'
 
+# Number of products that nrr-store reads concurrently
+STORE_THREADS = 8
+
+# Budget per lock acquisition of nrr-store: chunks are written together in a
+# single store update until the uncompressed bytes or the seconds under the
+# lock exceed one of these.
+STORE_BATCH_BYTES = 256 * 1024 * 1024
+STORE_BATCH_SECONDS = 30
+
+# nrr-watch: seconds to collect products into a batch, and the delivery
+# period to scan on startup, and every interval seconds without events, for
+# example on network shares that do not report files from other hosts; day
+# directories are watched for the delivery time of their product code plus
+# a margin
+WATCH_WAIT = 5
+WATCH_PERIOD = '3h'
+WATCH_INTERVAL = 300
+WATCH_MARGIN = Timedelta(days=1)
+
+# nrr-move: seconds between checks that the share shows a chunk update,
+# doubling up to a maximum, and the seconds after which to give up waiting
+MOVE_POLL_INTERVAL = 0.5
+MOVE_POLL_MAXIMUM = 8
+MOVE_POLL_TIMEOUT = 120
+
+# nrr-move: seconds to hold a lock for moving chunks, unless others wait
+MOVE_LOCK_BUDGET = 60
+
+# nrr-export: windows to read from the store per second (None for no limit)
+# and threads for compressing a GeoTIFF (a number or ALL_CPUS)
+EXPORT_READ_RATE = 4
+EXPORT_GDAL_THREADS = 'ALL_CPUS'
+
 # Delivery times for various products (not a dict, because order matters)
 DELIVERY_TIMES = (
     ('x', Timedelta()),
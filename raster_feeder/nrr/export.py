@@ -1,24 +1,31 @@
 # (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
 # -*- coding: utf-8 -*-
 """
-Export aggregated data from an NRR raster-store into separate GeoTIFF files.
+Export aggregated data from an NRR raster-store into separate GeoTIFF files,
+or into a single time-stacked NetCDF4 file.
 """
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import contextmanager
 from datetime import datetime as Datetime
 from datetime import timedelta as Timedelta
-from os import makedirs
-from os.path import exists, join
+from os import makedirs, rename
+from os.path import dirname, exists, join, relpath
 from time import sleep
 
 import argparse
+import collections
+import functools
+import hashlib
+import json
+import time
 
-from osgeo import gdal
-from osgeo import osr
 from raster_store import datasets
 from raster_store import load
 import numpy as np
 
 from . import config
+from . import utils
+from .. import setup
 
 GEO_TRANSFORM = -110000, 1000, 0, 700000, 0, -1000
 PROJECTION = "EPSG:28992"
@@ -37,11 +44,9 @@ REQUEST = {
 KWARGS = {
     'geo_transform': GEO_TRANSFORM,
     'no_data_value': NO_DATA_VALUE,
-    'projection': osr.GetUserInputAsWKT(PROJECTION),
 }
 
 DTYPE = 'f4'
-GTIFF = gdal.GetDriverByName('GTiff')
 
 
 def parse_period(text):
@@ -52,6 +57,20 @@ def parse_period(text):
     )
 
 
+class RateLimiter(object):
+    """Limit the rate at which wait() returns, if rate is not None."""
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.due = time.monotonic()
+
+    def wait(self):
+        now = time.monotonic()
+        if self.due > now:
+            sleep(self.due - now)
+        self.due = max(now, self.due) + self.interval
+
+
+@functools.lru_cache()
 def get_store(product):
     """Return a raster store."""
     path = join(config.STORE_DIR, product)
@@ -72,9 +91,10 @@ def get_snapped(datetime, step, offset):
     return Datetime.fromtimestamp((total // delta) * delta)
 
 
-def get_datetimes(store, period, size):
-    """Return groups of dates of `size`. It is assumed that the start is
-    already rounded to timedelta.
+def get_datetimes(store, period, size, step=None):
+    """Return groups of dates of `size`, ending every `step` dates (by
+    default `size`). It is assumed that the start is already rounded to
+    timedelta.
     """
     # snap start
     start, end = period
@@ -84,7 +104,7 @@ def get_datetimes(store, period, size):
         offset = Timedelta(hours=8)  # NRR days start at 8.
     else:
         offset = Timedelta()
-    step = size * delta
+    step = (size if step is None else step) * delta
     datetime = get_snapped(datetime=start, step=step, offset=offset)
 
     # return groups that completely fit in store period
@@ -97,58 +117,424 @@ def get_datetimes(store, period, size):
         datetime += step
 
 
-@contextmanager
-def get_dataset(store, datetimes):
-    """Return dataset of dataset tuples.
+def get_values(store, datetimes):
+    """Return array of values summed over datetimes.
 
     Args:
         store: Store object Storeinstance.
-        datetimes: Datetimes to query and accumulate.
+        datetimes: Consecutive datetimes to query and accumulate.
+    """
+    # get data for all datetimes in a single request
+    request = {"start": datetimes[0], "stop": datetimes[-1], **REQUEST}
+    data = store.get_data(**request)
+    values_in = data["values"]
+    active_in = values_in != data["no_data_value"]
+
+    # sum active values in order, nodata only where all frames are nodata
+    values = np.where(active_in, values_in, 0).sum(
+        axis=0, dtype=DTYPE, keepdims=True,
+    )
+    values[~active_in.any(axis=0, keepdims=True)] = NO_DATA_VALUE
+    return values
+
+
+class RollingSum(object):
+    """Sum of valid values of the last size frames.
+
+    The frames are kept in a ring buffer, so that each frame is read only
+    once. The sum is computed from the buffer in frame order, to yield the
+    same values as get_values().
+    """
+    def __init__(self, size):
+        shape = size, HEIGHT, WIDTH
+        self.frames = np.zeros(shape, dtype=DTYPE)
+        self.valid = np.zeros(shape, dtype=bool)
+        self.index = 0
+
+    def push(self, frame, valid):
+        """Add frame, replacing the oldest one."""
+        self.frames[self.index] = np.where(valid, frame, 0)
+        self.valid[self.index] = valid
+        self.index = (self.index + 1) % len(self.frames)
+
+    def get_values(self):
+        """Return array of values like get_values()."""
+        # the oldest frame is at the index
+        frames = np.roll(self.frames, -self.index, axis=0)
+        values = frames.sum(axis=0, dtype=DTYPE, keepdims=True)
+        values[~self.valid.any(axis=0, keepdims=True)] = NO_DATA_VALUE
+        return values
+
+
+def get_rolling_values(store, windows, limiter):
+    """Return generator of (datetimes, values) tuples for windows.
+
+    Each frame is read once, in a single request for the frames that the
+    window adds to the previous one. Windows that do not overlap the
+    previous one start a new sum.
     """
-    values = np.full((1, HEIGHT, WIDTH), NO_DATA_VALUE, dtype=DTYPE)
-    active = (values != NO_DATA_VALUE)
-    for datetime in datetimes:
-        # get data
-        request = {"start": datetime, "stop": datetime, **REQUEST}
+    last = None
+    for datetimes in windows:
+        if last is None or datetimes[0] > last:
+            rolling = RollingSum(size=len(datetimes))
+            frames = datetimes
+        else:
+            frames = [d for d in datetimes if d > last]
+        limiter.wait()
+        request = {"start": frames[0], "stop": frames[-1], **REQUEST}
         data = store.get_data(**request)
-        values_in = data["values"]
-        active_in = values_in != data["no_data_value"]
+        active = data["values"] != data["no_data_value"]
+        for frame, valid in zip(data["values"], active):
+            rolling.push(frame, valid)
+        last = datetimes[-1]
+        yield datetimes, rolling.get_values()
+
+
+def accumulate(product, datetimes):
+    """Return values summed over datetimes, for use in a worker process."""
+    return get_values(store=get_store(product), datetimes=datetimes)
 
-        # sum values that are active in both arrays
-        both_active = (active & active_in)
-        values[both_active] += values_in[both_active]
 
-        # set values that are active only in the new array
-        new_active = (~active & active_in)
-        values[new_active] = values_in[new_active]
-        active[new_active] = True
+@contextmanager
+def get_dataset(values):
+    """Return dataset for values.
 
-    with datasets.Dataset(values, **KWARGS) as dataset:
+    Args:
+        values: Array of summed values.
+    """
+    kwargs = {'projection': utils.get_wkt(PROJECTION), **KWARGS}
+    with datasets.Dataset(values, **kwargs) as dataset:
         yield dataset
 
 
-def export(product, period, path, size):
-    store = get_store(product)
-    for datetimes in get_datetimes(store=store, period=period, size=size):
-        timestamps = [d.strftime('%Y%m%d%H%M') for d in datetimes]
-        # destination path
-        tif_name = timestamps[-1] + '.tif'
-        tif_dir = join(path, tif_name[0:4], tif_name[4:6], tif_name[6:8])
-        tif_path = join(tif_dir, tif_name)
-        makedirs(tif_dir, exist_ok=True)
+class Manifest(object):
+    """JSON lines index of the files exported into a destination directory.
+
+    Records hold the file name relative to the destination, the frame
+    timestamps, the latest time a frame was stored in the source store and
+    a checksum of the exported values. Later records for the same name
+    replace earlier ones.
+    """
+    NAME = 'manifest.jsonl'
+
+    def __init__(self, path):
+        self.path = join(path, self.NAME)
+        self.records = {}
+        self.file = None
+        self.torn = False
+
+        if not exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                self.torn = not line.endswith('\n')
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # cut short by an interrupted run
+                self.records[record['name']] = record
+
+    def get(self, name):
+        """Return record for name or None."""
+        return self.records.get(name)
+
+    def add(self, name, timestamps, stored, checksum):
+        """Append a record to the manifest."""
+        record = {'name': name,
+                  'timestamps': timestamps,
+                  'stored': stored,
+                  'checksum': checksum}
+        if self.file is None:
+            makedirs(dirname(self.path) or '.', exist_ok=True)
+            self.file = open(self.path, 'a')
+            if self.torn:
+                self.file.write('\n')
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        self.records[name] = record
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class TIFFWriter(object):
+    """Write each window to a GeoTIFF in a YYYY/MM/DD directory tree.
+
+    Exported windows are looked up in a manifest in the destination instead
+    of on disk. Files from before the manifest are looked up in a listing
+    of their directory, and then added to the manifest. The meta of the
+    source is only fetched for the records and with changed, in blocks.
+
+    With changed, windows are exported again if the source was stored after
+    they were exported, or if it is unknown when they were exported
+    relative to that.
+    """
+    OPTIONS = ['compress=deflate']
+    META_FRAMES = 1024  # frames to fetch the meta of per request
+
+    def __init__(self, store, product, path, period, size, changed=False):
+        from osgeo import gdal
+
+        self.driver = gdal.GetDriverByName('GTiff')
+        self.store = store
+        self.product = product
+        self.path = path
+        self.period = period
+        self.changed = changed
+
+        self.manifest = Manifest(path)
+        self.index = utils.DirectoryIndex()  # for files without a record
+        self.directories = set()
+        self.metas = None
+        self.metas_period = None
+
+    def get_path(self, datetimes):
+        tif_name = datetimes[-1].strftime('%Y%m%d%H%M') + '.tif'
+        tif_dir = join(self.path, tif_name[0:4], tif_name[4:6], tif_name[6:8])
+        return join(tif_dir, tif_name)
+
+    def get_stored(self, datetimes):
+        """Return the latest time a frame of the window was stored or None."""
+        if (self.metas is None
+                or datetimes[0] < self.metas_period[0]
+                or datetimes[-1] > self.metas_period[1]):
+            from raster_store.interfaces import GeoInterface
+
+            # fetch meta for a block of frames from the window on
+            span = self.store.timedelta * (self.META_FRAMES - 1)
+            stop = min(self.period[1], datetimes[0] + span)
+            self.metas_period = datetimes[0], max(datetimes[-1], stop)
+            self.metas = GeoInterface(self.store).get_meta(
+                start=self.metas_period[0].isoformat(),
+                stop=self.metas_period[1].isoformat(),
+            )
+        stored = [json.loads(meta).get('stored')
+                  for meta in map(self.metas.get, datetimes) if meta]
+        stored = [s for s in stored if s]
+        return max(stored) if stored else None
+
+    def skip(self, datetimes):
+        """Return if the window was exported before."""
+        tif_path = self.get_path(datetimes)
+        name = relpath(tif_path, self.path)
+
+        if self.manifest.get(name) is None:
+            # the file may have been exported before there was a manifest
+            if not self.index.exists(tif_path):
+                return False
+            self.manifest.add(
+                name=name,
+                timestamps=[d.strftime('%Y%m%d%H%M') for d in datetimes],
+                stored=None,
+                checksum=None,
+            )
+        if self.changed:
+            # files from before the manifest are not known to be up to date
+            exported = self.manifest.get(name)['stored']
+            stored = self.get_stored(datetimes)
+            if stored is not None and (exported is None or stored > exported):
+                print(f'Changed {tif_path}')
+                return False
 
-        if exists(tif_path):
-            print(f'Skip {tif_path}')
-            continue
+        print(f'Skip {tif_path}')
+        return True
 
-        with get_dataset(store=store, datetimes=datetimes) as dataset:
+    def prepare(self, dataset):
+        """Prepare dataset for copying into the GeoTIFF."""
+
+    def write(self, values, datetimes):
+        timestamps = [d.strftime('%Y%m%d%H%M') for d in datetimes]
+        tif_path = self.get_path(datetimes)
+        with get_dataset(values) as dataset:
             dataset.SetMetadata(
-                {'product': product, 'timestamps': ','.join(timestamps)},
+                {'product': self.product, 'timestamps': ','.join(timestamps)},
             )
+            self.prepare(dataset)
             print(f'Save {tif_path}')
-            GTIFF.CreateCopy(tif_path, dataset, options=['compress=deflate'])
+            options = self.OPTIONS + [
+                f'num_threads={config.EXPORT_GDAL_THREADS}',
+            ]
+            tif_dir = dirname(tif_path)
+            if tif_dir not in self.directories:
+                makedirs(tif_dir, exist_ok=True)
+                self.directories.add(tif_dir)
+            self.driver.CreateCopy(tif_path, dataset, options=options)
 
-        sleep(1)
+        self.manifest.add(
+            name=relpath(tif_path, self.path),
+            timestamps=timestamps,
+            stored=self.get_stored(datetimes),
+            checksum=hashlib.sha256(values.tobytes()).hexdigest(),
+        )
+
+    def close(self):
+        self.manifest.close()
+
+
+class COGWriter(TIFFWriter):
+    """Write each window to a tiled GeoTIFF with overviews (COG)."""
+    OPTIONS = ['compress=deflate', 'tiled=yes', 'blockxsize=256',
+               'blockysize=256', 'copy_src_overviews=yes']
+    OVERVIEWS = [2, 4, 8]
+
+    def prepare(self, dataset):
+        dataset.BuildOverviews('AVERAGE', self.OVERVIEWS)
+
+
+class NetCDFWriter(object):
+    """Write all windows into a single time-stacked NetCDF4 file.
+
+    The file is written to a temporary name first, and renamed once all
+    windows are in. Windows are labeled with the time of their last frame.
+    """
+    UNITS = 'minutes since 2000-01-01 00:00:00'
+
+    def __init__(self, store, product, path, period, size, changed=False):
+        self.product = product
+        self.size = size
+        start, stop = (d.strftime('%Y%m%d%H%M') for d in period)
+        self.nc_path = join(path, f'{start}-{stop}.nc')
+        self.part_path = self.nc_path + '.part'
+        self.nc = None
+
+        self.exists = exists(self.nc_path)
+        if self.exists:
+            print(f'Skip {self.nc_path}')
+
+    def skip(self, datetimes):
+        """Return if the file was exported before."""
+        return self.exists
+
+    def open(self):
+        import netCDF4
+
+        makedirs(dirname(self.nc_path) or '.', exist_ok=True)
+        nc = netCDF4.Dataset(self.part_path, 'w')
+        nc.product = self.product
+        nc.aggregation_size = self.size
+
+        nc.createDimension('time', None)
+        nc.createDimension('y', HEIGHT)
+        nc.createDimension('x', WIDTH)
+        nc.createDimension('nv', 2)
+
+        time = nc.createVariable('time', 'f8', ('time',))
+        time.standard_name = 'time'
+        time.units = self.UNITS
+        time.bounds = 'time_bnds'
+        nc.createVariable('time_bnds', 'f8', ('time', 'nv'))
+
+        # cell centers
+        x1, dx, _, y2, _, dy = GEO_TRANSFORM
+        x = nc.createVariable('x', 'f8', ('x',))
+        x.standard_name = 'projection_x_coordinate'
+        x.units = 'm'
+        x[:] = x1 + dx * (np.arange(WIDTH) + 0.5)
+        y = nc.createVariable('y', 'f8', ('y',))
+        y.standard_name = 'projection_y_coordinate'
+        y.units = 'm'
+        y[:] = y2 + dy * (np.arange(HEIGHT) + 0.5)
+
+        crs = nc.createVariable('crs', 'i4')
+        crs.crs_wkt = utils.get_wkt(PROJECTION)
+        crs.spatial_ref = crs.crs_wkt
+
+        values = nc.createVariable(
+            'precipitation', DTYPE, ('time', 'y', 'x'),
+            zlib=True, chunksizes=(1, HEIGHT, WIDTH),
+            fill_value=NO_DATA_VALUE,
+        )
+        values.units = 'mm'
+        values.grid_mapping = 'crs'
+        return nc
+
+    def write(self, values, datetimes):
+        import netCDF4
+
+        if self.nc is None:
+            self.nc = self.open()
+        index = len(self.nc.dimensions['time'])
+        bounds = netCDF4.date2num([datetimes[0], datetimes[-1]], self.UNITS)
+        self.nc['time'][index] = bounds[-1]
+        self.nc['time_bnds'][index] = bounds
+        self.nc['precipitation'][index] = values[0]
+        timestamp = datetimes[-1].strftime('%Y%m%d%H%M')
+        print(f'Save {timestamp} into {self.nc_path}')
+
+    def close(self):
+        if self.nc is None:
+            return
+        self.nc.close()
+        rename(self.part_path, self.nc_path)
+
+
+WRITERS = {
+    'tif': TIFFWriter,
+    'cog': COGWriter,
+    'netcdf': NetCDFWriter,
+}
+
+
+def export(product, period, path, size, step=None, processes=1,
+           rate=config.EXPORT_READ_RATE, output='tif', changed=False):
+    """
+    Export windows of size frames, every step frames, from a store.
+
+    With multiple processes, windows are read and summed in worker
+    processes, and written in order by this one. The reads are started at
+    most rate times per second.
+
+    Overlapping windows, where step is smaller than size, are summed in
+    this process, reading each frame only once.
+
+    With changed, GeoTIFFs are exported again if their source data was
+    stored after they were exported.
+    """
+    store = get_store(product)
+    writer = WRITERS[output](
+        store=store,
+        product=product,
+        path=path,
+        period=period,
+        size=size,
+        changed=changed,
+    )
+    windows = get_datetimes(store=store, period=period, size=size, step=step)
+    limiter = RateLimiter(rate)
+
+    if step is not None and step < size:
+        for datetimes, values in get_rolling_values(
+                store=store, windows=windows, limiter=limiter):
+            if not writer.skip(datetimes):
+                writer.write(values=values, datetimes=datetimes)
+        writer.close()
+        return
+
+    windows = (d for d in windows if not writer.skip(d))
+    if processes == 1:
+        for datetimes in windows:
+            limiter.wait()
+            values = get_values(store=store, datetimes=datetimes)
+            writer.write(values=values, datetimes=datetimes)
+        writer.close()
+        return
+
+    # keep a limited number of windows in progress
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = collections.deque()
+        for datetimes in windows:
+            limiter.wait()
+            future = executor.submit(accumulate, product, datetimes)
+            pending.append((future, datetimes))
+            if len(pending) < 2 * processes:
+                continue
+            future, datetimes = pending.popleft()
+            writer.write(values=future.result(), datetimes=datetimes)
+        for future, datetimes in pending:
+            writer.write(values=future.result(), datetimes=datetimes)
+    writer.close()
 
 
 def get_parser():
@@ -181,10 +567,51 @@ def get_parser():
         default=1,
         help='Number of frames to sum into single export file.',
     )
+    parser.add_argument(
+        '--step', '-s',
+        type=int,
+        help=(
+            'Number of frames between the ends of consecutive windows, '
+            'defaults to the aggregation size.'
+        ),
+    )
+    parser.add_argument(
+        '--processes', '-p',
+        type=int,
+        default=1,
+        help='Number of worker processes to read and sum frames.',
+    )
+    parser.add_argument(
+        '--rate', '-r',
+        type=float,
+        default=config.EXPORT_READ_RATE,
+        help='Maximum number of windows to read per second.',
+    )
+    parser.add_argument(
+        '--output', '-o',
+        choices=sorted(WRITERS),
+        default='tif',
+        help=(
+            'Output format: a GeoTIFF per window, a cloud optimized GeoTIFF '
+            'per window or a single NetCDF4 file for the period.'
+        ),
+    )
+    parser.add_argument(
+        '--changed', '-c',
+        action='store_true',
+        help=(
+            'Export GeoTIFFs again if their source data has been changed, '
+            'not with netcdf output.'
+        ),
+    )
     return parser
 
 
 def main():
     """ Call move with args from parser. """
-    kwargs = vars(get_parser().parse_args())
+    parser = get_parser()
+    kwargs = vars(parser.parse_args())
+    if kwargs['changed'] and kwargs['output'] == 'netcdf':
+        parser.error('--changed is not supported for netcdf output.')
+    setup()
     export(**kwargs)
@@ -14,11 +14,11 @@ import logging
 import os
 import sys
 
-from osgeo import osr
-
 from raster_store import stores
 
 from . import config
+from . import utils
+from .. import setup
 
 logger = logging.getLogger(__name__)
 
@@ -48,14 +48,11 @@ DEPTHS = {'5min': {'real1':      (1,   12),   # noqa arrives every 5 minutes
                    'merge':      (6,  576),   # noqa merge at night
                    'final':    (512, 1024)}}  # noqa offload once a month at night
 
-WKT = osr.GetUserInputAsWKT(str(config.PROJECTION))
-
 ORIGINS = {'day': datetime.datetime(2000, 1, 1, 8),
            'hour': datetime.datetime(2000, 1, 1, 9),
            '5min': datetime.datetime(2000, 1, 1, 8, 5)}
 
 KWARGS = {'dtype': 'f4',
-          'projection': WKT,
           'geo_transform': config.GEO_TRANSFORM,
           'h5opts': {'scaleoffset': 2, 'compression': 'lzf'}}
 
@@ -85,6 +82,7 @@ def command():
                 'delta': DELTAS[group_name],
             }
             kwargs.update(KWARGS)
+            kwargs['projection'] = utils.get_wkt()
             kwargs['origin'] = ORIGINS[group_name]
             logger.info('Creating {}'.format(store_path))
             store = stores.Store.create(**kwargs)
@@ -129,6 +127,7 @@ def get_parser():
 def main():
     """ Call command with args from parser. """
     kwargs = vars(get_parser().parse_args())
+    setup()
 
     logging.basicConfig(**{'stream': sys.stderr, 'level': logging.INFO})
 
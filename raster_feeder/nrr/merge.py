@@ -5,32 +5,50 @@ Merge realtime, near-realtime, after and ultimate stores into a single
 'merge' store.
 """
 
+from concurrent.futures import ProcessPoolExecutor
+
 import argparse
 import logging
 import os
 import sys
 
 from . import config
+from .. import setup
 from . import move
 
 logger = logging.getLogger(__name__)
 
 
-def merge():
+SOURCE_NAMES = {
+    'day': ('real', 'near', 'after', 'ultimate'),
+    'hour': ('real', 'near', 'after', 'ultimate'),
+    '5min': ('real2', 'near', 'after', 'ultimate'),
+}
+
+
+def merge_group(time_name):
+    """ Call move for the sources of a time group, in order. """
+    for source_name in SOURCE_NAMES[time_name]:
+        move.move(target_name='merge',
+                  time_name=time_name,
+                  source_name=source_name)
+
+
+def merge(serial=False):
     """ Call move for a number of stores. """
     logger.info('Merge procedure initiated.')
 
-    source_names = {
-        'day': ('real', 'near', 'after', 'ultimate'),
-        'hour': ('real', 'near', 'after', 'ultimate'),
-        '5min': ('real2', 'near', 'after', 'ultimate'),
-    }
-
-    for time_name in ('day', 'hour', '5min'):
-        for source_name in source_names[time_name]:
-            move.move(target_name='merge',
-                      time_name=time_name,
-                      source_name=source_name)
+    time_names = ('day', 'hour', '5min')
+    if serial:
+        for time_name in time_names:
+            merge_group(time_name)
+    else:
+        # time groups lock separate resources and write to separate stores
+        with ProcessPoolExecutor(max_workers=len(time_names)) as executor:
+            futures = [executor.submit(merge_group, time_name)
+                       for time_name in time_names]
+        for future in futures:
+            future.result()
 
     logger.info('Merge procedure completed.')
 
@@ -44,12 +62,18 @@ def get_parser():
         '-v', '--verbose',
         action='store_true',
     )
+    parser.add_argument(
+        '-s', '--serial',
+        action='store_true',
+        help='Merge the time groups one after another.',
+    )
     return parser
 
 
 def main():
     """ Call merge with args from parser. """
     kwargs = vars(get_parser().parse_args())
+    setup()
 
     # logging
     if kwargs.pop('verbose'):
@@ -5,16 +5,22 @@ Move data from one store to another, flushing the store but leaving it intact.
 """
 
 import argparse
+import hashlib
+import json
 import logging
 import os
 import sys
 import time
 
 from raster_store import load
+from raster_store.interfaces import GeoInterface
 
+from turn.core import Keys
 import turn
 
 from . import config
+from . import utils
+from .. import setup
 
 logger = logging.getLogger(__name__)
 
@@ -25,10 +31,89 @@ def get_store(time_name, store_name):
     return load(path)
 
 
-def move_target_chunk_equivalent(source, target):
+def get_metas(source, start, stop):
+    """
+    Return dictionary of datetime: meta of the bands with data in source
+    from start up to and with stop.
+    """
+    metas = GeoInterface(source).get_meta(
+        start=start.isoformat(), stop=stop.isoformat(),
+    )
+    return {d: meta for d, meta in metas.items() if meta}
+
+
+def get_extent(metas):
+    """ Return (first, last) datetimes of metas or None. """
+    return (min(metas), max(metas)) if metas else None
+
+
+def get_fingerprint(metas):
+    """
+    Return a hash of metas.
+
+    The meta of a band records when it was stored, so the hash changes when
+    anything is stored into the source chunk.
+    """
+    items = sorted((d.isoformat(), meta) for d, meta in metas.items())
+    return hashlib.sha256(json.dumps(items).encode('utf-8')).hexdigest()
+
+
+def is_settled(target, extent):
+    """ Return if the share shows target containing the extent. """
+    try:
+        period = load(target.path).period
+    except Exception:
+        return False
+    first, last = extent
+    return bool(period) and period[0] <= first and last <= period[1]
+
+
+def wait_until_settled(target, extent):
+    """
+    Poll the share with exponential backoff until the update is visible.
+
+    The exclusive create (for the lockfile) seems to make the share nervous,
+    so the source is only touched again once the share shows the target
+    containing the extent of the copied bands, or after a timeout. Returns
+    the number of seconds waited.
+    """
+    if extent is None:
+        return 0  # nothing was copied
+    started = time.monotonic()
+    interval = config.MOVE_POLL_INTERVAL
+    while not is_settled(target=target, extent=extent):
+        waited = time.monotonic() - started
+        if waited >= config.MOVE_POLL_TIMEOUT:
+            logger.warning('Share not settled after {:.1f} s.'.format(waited))
+            return waited
+        time.sleep(min(interval, config.MOVE_POLL_TIMEOUT - waited))
+        interval = min(2 * interval, config.MOVE_POLL_MAXIMUM)
+    waited = time.monotonic() - started
+    logger.info('Share settled after {:.1f} s.'.format(waited))
+    return waited
+
+
+def has_waiters(locker, resource):
+    """ Return if other processes queue for a resource held by this one. """
+    keys = Keys(resource)
+    indicator, dispenser = locker.client.mget(keys.indicator, keys.dispenser)
+    return int(dispenser or 0) > int(indicator or 0)
+
+
+def get_journal(time_name, source_name, target_name):
+    """ Return the journal for moves from source to target. """
+    os.makedirs(str(config.JOURNAL_DIR), exist_ok=True)
+    name = '{}-{}-{}.journal'.format(time_name, source_name, target_name)
+    return utils.Journal(os.path.join(str(config.JOURNAL_DIR), name))
+
+
+def move_target_chunk_equivalent(source, target, time_name, journal):
     """
     Move at most an amount of bands equal to the target's max depth from
     source to target.
+
+    A chunk that the journal has as copied is not copied again if the
+    source chunk still has the fingerprint it had when it was copied.
     """
     # start move at beginning of source's period
     start = source.period[0]
@@ -43,19 +128,36 @@ def move_target_chunk_equivalent(source, target):
     # stop at last date in chunk or end of store, whichever comes first
     stop = min(source.period[1], target.timeorigin + target.timedelta * last)
 
+    # the bands that the target should show once the update is visible
+    metas = get_metas(source=source, start=start, stop=stop)
+    extent = get_extent(metas)
+    fingerprint = get_fingerprint(metas)
+
     # let's move
-    logger.info('Move between {} and {}.'.format(start, stop))
-    target.update(source, start=start, stop=stop, multi=False)
+    copied = journal.get(start, stop) == journal.COPIED
+    if copied and journal.get_fingerprint(start, stop) == fingerprint:
+        logger.info('Resume between {} and {}.'.format(start, stop))
+    else:
+        logger.info('Move between {} and {}.'.format(start, stop))
+        target.update(source, start=start, stop=stop, multi=False)
+        utils.get_meta_cache().invalidate(
+            name=time_name, start=start, stop=stop,
+        )
+        journal.record(start, stop, journal.COPIED, fingerprint=fingerprint)
 
-    # the exclusive create (for the lockfile) seems to make the share nervous,
-    # so some rest time is added here
-    time.sleep(20)
+    wait_until_settled(target=target, extent=extent)
     source.delete(start=start, stop=stop)
+    journal.record(start, stop, journal.DELETED)
 
 
-def move(time_name, source_name, target_name):
+def move(time_name, source_name, target_name,
+         budget=config.MOVE_LOCK_BUDGET):
     """
     Move data from one radar store into another.
+
+    Per lock, chunks are moved for as long as the next one is expected to
+    fit in budget seconds, judging by the recent chunks, and nobody else is
+    waiting for the lock.
     """
     logger.info('Move procedure initiated for {}.'.format(time_name))
 
@@ -69,10 +171,31 @@ def move(time_name, source_name, target_name):
     message = template.format(time_name, source_name, time_name, target_name)
     logger.info(message)
     source = get_store(time_name=time_name, store_name=source_name)
+    journal = get_journal(
+        time_name=time_name, source_name=source_name, target_name=target_name,
+    )
+    if journal:
+        logger.info('Resume from journal {}.'.format(journal.path))
+    cost = None  # smoothed seconds per chunk
     while source:
         # lock in chunks to let other processes do things, as well.
         with locker.lock(resource=time_name, label=label):
-            move_target_chunk_equivalent(source=source, target=target)
+            locked = time.monotonic()
+            while source:
+                start = time.monotonic()
+                move_target_chunk_equivalent(
+                    source=source, target=target, time_name=time_name,
+                    journal=journal,
+                )
+                now = time.monotonic()
+                seconds = now - start
+                cost = seconds if cost is None else (cost + seconds) / 2
+                if now - locked + cost > budget:
+                    break
+                if has_waiters(locker=locker, resource=time_name):
+                    logger.info('Release lock for waiting processes.')
+                    break
+    journal.remove()
     logger.info('Move procedure completed.')
 
 
@@ -101,12 +224,19 @@ def get_parser():
         '-v', '--verbose',
         action='store_true',
     )
+    parser.add_argument(
+        '-b', '--budget',
+        type=float,
+        default=config.MOVE_LOCK_BUDGET,
+        help='Seconds to hold the lock for moving multiple chunks.',
+    )
     return parser
 
 
 def main():
     """ Call move with args from parser. """
     kwargs = vars(get_parser().parse_args())
+    setup()
 
     # logging
     if kwargs.pop('verbose'):
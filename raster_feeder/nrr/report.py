@@ -6,6 +6,7 @@ Report on the actual state of the radar stores.
 
 import argparse
 import datetime
+import itertools
 import json
 import logging
 import os
@@ -16,8 +17,10 @@ from email.mime.text import MIMEText
 
 from raster_store import load
 from raster_store.interfaces import GeoInterface
+import numpy as np
 
 from . import config
+from .. import setup
 from . import periods
 from . import utils
 
@@ -33,6 +36,9 @@ KED = 'Kriging External Drift'
 IDW = 'Inverse Distance Weighting'
 RAW = 'None'
 
+# prodcodes in order of increasing quality
+PRODCODES = 'rnau'
+
 TEMPLATE_LOG = '{datetime} {timeframe} {message}'
 TEMPLATE_EMAIL = """
 The automated quality checker on the NRR data storage found that some
@@ -49,6 +55,75 @@ def get_metas(name, period):
     return {k: json.loads(v) for k, v in metas.items() if v}
 
 
+def get_times(period):
+    """ Return dictionary of datetime64 arrays of period per timeframe. """
+    step = np.timedelta64(5, 'm')
+    start = np.datetime64(period.start, 'us')
+    stop = np.datetime64(period.stop, 'us')
+    times = np.arange(start, stop + step, step)
+
+    # see utils.get_valid_timeframes()
+    hours = times.astype('M8[h]')
+    on_hour = times == hours
+    at_eight = hours - hours.astype('M8[D]') == np.timedelta64(8, 'h')
+    return {'f': times, 'h': times[on_hour], 'd': times[on_hour & at_eight]}
+
+
+class Columns(object):
+    """
+    Metas for an array of times, decoded into an array per field.
+
+    Prodcodes and calibrations are codes into lists of labels that start
+    with the known ones: the empty prodcode of missing products followed by
+    PRODCODES, and RAW, IDW and KED. A composite count of -1 means it is
+    missing.
+    """
+    def __init__(self, times, metas):
+        self.times = times
+        self.prodcode_labels = [''] + list(PRODCODES)
+        self.calibration_labels = [RAW, IDW, KED]
+
+        size = len(times)
+        self.prodcode = np.zeros(size, dtype='i2')
+        self.calibration = np.zeros(size, dtype='i2')
+        self.composite_count = np.full(size, -1, dtype='i4')
+
+        # positions of the metas in the times
+        dates = np.array(list(metas), dtype='M8[us]')
+        positions = np.searchsorted(times, dates)
+        found = positions < size
+        found[found] = times[positions[found]] == dates[found]
+
+        prodcodes = {v: k for k, v in enumerate(self.prodcode_labels)}
+        calibrations = {v: k for k, v in enumerate(self.calibration_labels)}
+        for position, meta in zip(positions[found],
+                                  itertools.compress(metas.values(), found)):
+            self.prodcode[position] = self._encode(
+                prodcodes, self.prodcode_labels, meta.get('prodcode', ''),
+            )
+            self.calibration[position] = self._encode(
+                calibrations,
+                self.calibration_labels,
+                meta.get('cal_method', 'None'),
+            )
+            if 'composite_count' in meta:
+                count = meta['composite_count']
+                if count == 1:
+                    count = 1
+                elif not isinstance(count, int):
+                    count = 0
+                self.composite_count[position] = count
+
+    def _encode(self, codes, labels, value):
+        """ Return code for value, adding it to labels if needed. """
+        try:
+            return codes[value]
+        except KeyError:
+            codes[value] = len(labels)
+            labels.append(value)
+            return codes[value]
+
+
 def send_mail(report):
     """ Send report as email. """
     recipients = getattr(config, 'REPORT_RECIPIENTS', [])
@@ -91,6 +166,7 @@ class Checker(object):
         self.quality = quality
 
     def check(self, meta, date):
+        """ Return failure message for the meta of a date, or None. """
         # what do we have
         actual_prodcode = meta.get('prodcode', '')
         actual_calibration = meta.get('cal_method', 'None')
@@ -139,6 +215,66 @@ class Checker(object):
             exp = expected_calibration[0]
             return self.template1.format(exp=exp, act=act)
 
+    def check_columns(self, columns):
+        """
+        Return list of (index, message) tuples for the failures in columns.
+
+        Gives the same messages as check() on the meta at every time.
+        """
+        times = columns.times
+
+        # index into PRODCODES of the least acceptable prodcode, -1 for none
+        zone = np.full(len(times), -1, dtype='i1')
+        for level, bound in enumerate((self.r, self.n, self.a, self.u)):
+            zone[times < np.datetime64(bound, 'us')] = level
+
+        # dates in the after and ultimate zones need a composite count
+        uncounted = (zone >= 2) & (columns.composite_count == -1)
+        for index in np.flatnonzero(uncounted):
+            date = times[index].astype(datetime.datetime)
+            logger.debug('{}: no product or no meta.'.format(date))
+        checked = (zone >= 0) & ~uncounted
+
+        # prodcodes
+        prodcode = columns.prodcode
+        known = prodcode <= len(PRODCODES)
+        absent = checked & (prodcode == 0)
+        inferior = checked & (prodcode > 0) & (~known | (prodcode - 1 < zone))
+        failed = absent | inferior
+
+        # calibrations
+        calibration = columns.calibration
+        single = columns.composite_count == 1
+        if self.quality:
+            # raw, idw and ked are codes 0, 1 and 2
+            expected = np.where(single, 1, 2)
+            wrong = np.select(
+                [zone >= 2, zone == 1],
+                [calibration != expected,
+                 (calibration != 1) & (calibration != 2)],
+                calibration > 2,
+            )
+            miscalibrated = checked & ~failed & wrong
+            failed |= miscalibrated
+
+        failures = []
+        for index in np.flatnonzero(failed):
+            exp = self.names[PRODCODES[zone[index]]]
+            if absent[index]:
+                message = self.template0.format(exp=exp)
+            elif inferior[index]:
+                act = self.names[columns.prodcode_labels[prodcode[index]]]
+                message = self.template1.format(exp=exp, act=act)
+            else:
+                act = columns.calibration_labels[calibration[index]]
+                if zone[index] >= 2:
+                    exp = IDW if single[index] else KED
+                else:
+                    exp = (RAW, IDW)[zone[index]]
+                message = self.template1.format(exp=exp, act=act)
+            failures.append((index, message))
+        return failures
+
 
 def report(text, quality):
     """
@@ -151,14 +287,18 @@ def report(text, quality):
     checker = Checker(quality)
     failures = []
 
-    # the checking
-    for d in period:
-        for t in utils.get_valid_timeframes(d):
-            m = checker.check(meta=metas[t].get(d, {}), date=d)
-            if m:
-                failures.append(TEMPLATE_LOG.format(
-                    datetime=d, timeframe=t, message=m,
-                ))
+    # the checking, per timeframe
+    times = get_times(period)
+    for rank, t in enumerate('fhd'):
+        columns = Columns(times=times[t], metas=metas[t])
+        for index, m in checker.check_columns(columns):
+            d = times[t][index].astype(datetime.datetime)
+            failures.append((d, rank, TEMPLATE_LOG.format(
+                datetime=d, timeframe=t, message=m,
+            )))
+
+    # in order of datetime, then timeframe
+    failures = [f for d, rank, f in sorted(failures)]
 
     # communicate
     if failures:
@@ -196,6 +336,7 @@ def get_parser():
 def main():
     """ Call report with args from parser. """
     kwargs = vars(get_parser().parse_args())
+    setup()
 
     # logging
     if kwargs.pop('verbose'):
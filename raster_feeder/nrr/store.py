@@ -4,25 +4,29 @@
 Store latest radar into store.
 """
 
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime as Datetime
 from datetime import timedelta as Timedelta
-from os.path import getmtime, join
+from os.path import getmtime, getsize, join
 import argparse
+import io
 import json
 import logging
 import sys
+import time
 
+import ciso8601
 import h5py
 import numpy as np
 import turn
 
-from osgeo import osr
-
 from raster_store import regions
 from raster_store import load
 from raster_store.interfaces import GeoInterface
 
 from . import config
+from .. import setup
 from . import periods
 from . import utils
 
@@ -34,8 +38,8 @@ GEO_TRANSFORM = config.GEO_TRANSFORM
 LEVELS = {'r': 1, 'n': 2, 'a': 3, 'u': 4}
 EPOCH = Datetime.fromtimestamp(0).isoformat()
 ROOT = config.STORE_DIR
-NOW = Datetime.now().isoformat()  # or should we refresh more often?
-WKT = osr.GetUserInputAsWKT(str(config.PROJECTION))
+SHAPE = 490, 500
+KNMI_FILLVALUE = 65535
 
 NAMES = {'f': {'r': dict(group='5min', store='real1'),
                'n': dict(group='5min', store='near'),
@@ -50,6 +54,9 @@ NAMES = {'f': {'r': dict(group='5min', store='real1'),
                'a': dict(group='day', store='after'),
                'u': dict(group='day', store='ultimate')}}
 
+# products that users look at as they arrive
+REALTIME = 'rn'
+
 PRODUCTS = {'r': 'realtime',
             'n': 'near-realtime', 'a': 'after', 'u': 'ultimate'}
 
@@ -64,48 +71,108 @@ def get_path_helper(timeframe, prodcode):
     return utils.PathHelper(basedir=basedir, code=code, template=template)
 
 
-def get_mtime(path):
+def get_mtime(path, index=None):
     """
-    Return isoformat mtime.
+    Return isoformat mtime, from index if given.
 
     Add one second to prevent resolution things.
     """
-    return Datetime.fromtimestamp(getmtime(path) + 1).isoformat()
+    mtime = getmtime(path) if index is None else index.getmtime(path)
+    return Datetime.fromtimestamp(mtime + 1).isoformat()
+
+
+def get_size(path, index=None):
+    """ Return size in bytes, from index if given. """
+    return getsize(path) if index is None else index.getsize(path)
+
+
+def get_meta(h5):
+    """ Return json serializable meta dictionary from h5 attributes. """
+    meta = dict(h5.attrs)
+    for k, v in meta.items():
+        # numpy array
+        if hasattr(v, 'size'):
+            if v.size == 0:
+                meta[k] = []
+            elif v.size == 1 and v.ndim == 0:
+                meta[k] = v.item()
+            else:
+                meta[k] = [
+                    e.decode('ascii')
+                    if hasattr(e, 'decode') else e
+                    for e in v.tolist()
+                ]
+        # bytes
+        elif hasattr(v, 'decode'):
+            meta[k] = v.decode('ascii')
+    return meta
+
+
+def read_contents(path, out):
+    """
+    Read data into out and return meta dictionary.
 
+    :param path: path to or file object with KNMI HDF5 data
+    :param out: C-contiguous array of the image shape to read into
 
-def get_contents(path):
-    """ Return data, meta dictionary. """
+    The data is converted to the dtype of out by HDF5 while reading, and
+    then scaled and masked in place.
+    """
     with h5py.File(path, 'r') as h5:
-        # use the knmi specification data
-        data = h5['image1/image_data'][:] * 0.01
-        fillvalue = 65535 * 0.01
-        meta = dict(h5.attrs)
-
-        # make json serializable
-        for k, v in meta.items():
-            # numpy array
-            if hasattr(v, 'size'):
-                if v.size == 0:
-                    meta[k] = []
-                elif v.size == 1 and v.ndim == 0:
-                    meta[k] = v.item()
-                else:
-                    meta[k] = [
-                        e.decode('ascii')
-                        if hasattr(e, 'decode') else e
-                        for e in v.tolist()
-                    ]
-            # bytes
-            elif hasattr(v, 'decode'):
-                meta[k] = v.decode('ascii')
-        return dict(data=data, meta=meta, fillvalue=fillvalue)
+        h5['image1/image_data'].read_direct(out)
+        meta = get_meta(h5)
+
+    # use the knmi specification data, scale in double precision
+    nodata = out == KNMI_FILLVALUE
+    np.multiply(out, 0.01, out=out, dtype='f8')
+    out[nodata] = config.NODATAVALUE
+    return meta
+
+
+def fetch_contents(path, out):
+    """
+    Fetch file at path into memory, then read it into out.
+
+    Reading the bytes does not take the global h5py lock, so that fetches
+    in separate threads overlap.
+    """
+    with open(path, 'rb') as f:
+        fileobj = io.BytesIO(f.read())
+    return read_contents(fileobj, out=out)
 
 
 class Store(object):
-    """ An autothrottling store. """
-    def __init__(self, timeframe, prodcode):
+    """
+    An autothrottling store.
+
+    :param timeframe: timeframe code
+    :param prodcode: product code
+    :param threads: number of products to read concurrently
+    :param scan: find products via directory scans and the mtime cache; use
+        False to look at the product files directly, for example when they
+        are known to have changed.
+    :param plan: if given, a dictionary to count what offload would do in,
+        instead of reading and writing any data.
+    :param batch_bytes: write pending chunks once their uncompressed size
+        reaches this many bytes
+    :param batch_seconds: write pending chunks once the lock has been held
+        for this many seconds
+    """
+    def __init__(self, timeframe, prodcode, threads=1, scan=True, plan=None,
+                 batch_bytes=config.STORE_BATCH_BYTES,
+                 batch_seconds=config.STORE_BATCH_SECONDS):
         self.timeframe = timeframe
         self.prodcode = prodcode
+        self.threads = threads
+        self.scan = scan
+        self.plan = plan
+        self.batch_bytes = batch_bytes
+        self.batch_seconds = batch_seconds
+
+        # regions and (datetime, source) tuples waiting to be written
+        self.pending = []
+        self.pending_sources = []
+        self.pending_bytes = 0
 
         # stores
         self.names = NAMES[timeframe][prodcode]
@@ -116,86 +183,195 @@ class Store(object):
 
         # others
         self.helper = get_path_helper(timeframe, prodcode)
+        self.index = utils.DirectoryIndex() if scan else None
+        self.mtimes = utils.MtimeCache(ttl=config.MTIME_CACHE_TTL)
         self.level = LEVELS[prodcode]
+        self.now = Datetime.now().isoformat()  # fresh per store run
 
     # meta caching and source queueing
+    def get_chunk(self, datetime):
+        """ Return number of the store chunk that contains datetime. """
+        # find band for current date
+        timedelta_seconds = self.store.timedelta.total_seconds()
+        position_seconds = (datetime - self.store.timeorigin).total_seconds()
+        current_band = int(round(position_seconds / timedelta_seconds))
+        return current_band // self.store.max_depth
+
     def reset(self, datetime):
         """ Init band lookup table for current chunk. """
-        # find band for current date
         timedelta = self.store.timedelta
-        timedelta_seconds = timedelta.total_seconds()
         origin = self.store.timeorigin
-        position_seconds = (datetime - origin).total_seconds()
-        current_band = int(round(position_seconds / timedelta_seconds))
 
-        # calculate chunk start and stop band for this date
+        # calculate chunk start band for this date
         chunk_depth = self.store.max_depth
-        current_chunk = current_band // chunk_depth
-        start_band = current_chunk * chunk_depth
+        start_band = self.get_chunk(datetime) * chunk_depth
 
         # determine bands and dates for sources for this chunk
         bands = range(chunk_depth)
         dates = [origin + timedelta * (start_band + b) for b in bands]
 
         # fetch meta in the store group for this chunk
-        start = dates[0].isoformat()
-        stop = dates[-1].isoformat()
-        self.meta = self.group.get_meta(start=start, stop=stop)
+        self.meta = utils.get_meta_cache().get_meta(
+            name=self.names['group'], group=self.group, dates=dates,
+        )
 
         # create sources dict and make look-up table for bands
         self.sources = {}  # put here items of datetime: (mtime, path)
         self.bands = dict(zip(dates, bands))
+        self.times = dict(zip(bands, dates))
 
-    def offload(self):
-        """ Load all accepted products into store. """
-        if not self.sources:
-            return False
-        # create region
-        start = min(self.sources)
-        stop = max(self.sources)
+        # fetch cached mtimes for the products in this chunk
+        if self.scan:
+            self.mtimes.load([self.helper.path(d) for d in dates])
+
+    def create_region(self, start, stop):
+        """ Return nodata region for bands from start up to and with stop. """
         size = stop - start + 1
-        shape = size, 490, 500
+        shape = (size,) + SHAPE
         bands = 0, shape[0]
-        data = np.ones(shape, self.store.dtype) * config.NODATAVALUE
+        data = np.full(shape, config.NODATAVALUE, self.store.dtype)
         meta = size * [None]
         time = sorted(t for t, b in self.bands.items() if start <= b <= stop)
-        region = regions.Region.from_mem(data=data,
-                                         meta=meta,
-                                         time=time,
-                                         bands=bands,
-                                         projection=WKT,
-                                         geo_transform=GEO_TRANSFORM,
-                                         fillvalue=config.NODATAVALUE)
-
-        # populate it
-        for band, source in self.sources.items():
-
-            contents = get_contents(source['path'])
-
-            data = np.where(
-                contents['data'] == contents['fillvalue'],
-                config.NODATAVALUE,
-                contents['data'],
-            )
-            region.box.data[band - start] = data
+        return regions.Region.from_mem(data=data,
+                                       meta=meta,
+                                       time=time,
+                                       bands=bands,
+                                       projection=utils.get_wkt(),
+                                       geo_transform=GEO_TRANSFORM,
+                                       fillvalue=config.NODATAVALUE)
 
-            meta = contents['meta']
-            meta.update({'stored': NOW,
+    def offload(self):
+        """
+        Read all accepted products into regions pending for writing.
+
+        Returns True if anything was added to the pending batch.
+        """
+        if not self.sources:
+            return False
+        itemsize = np.dtype(self.store.dtype).itemsize
+        bands = len(self.sources)
+        self.pending_bytes += bands * SHAPE[0] * SHAPE[1] * itemsize
+        if self.plan is not None:
+            return self.count()
+
+        # create a region per run of consecutive bands, so that bands
+        # between the sources are left alone
+        runs = utils.get_runs(self.sources)
+        targets = [self.create_region(start, stop) for start, stop in runs]
+        slots = {}  # band: (region, index)
+        for (start, stop), region in zip(runs, targets):
+            for band in range(start, stop + 1):
+                slots[band] = region, band - start
+
+        # populate them, fetching sources concurrently
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            futures = {}
+            for band, source in self.sources.items():
+                region, index = slots[band]
+                futures[band] = executor.submit(
+                    fetch_contents,
+                    source['path'],
+                    out=region.box.data[index],
+                )
+        for band, source in sorted(self.sources.items()):
+            region, index = slots[band]
+            meta = futures[band].result()
+            meta.update({'stored': self.now,
                          'modified': source['mtime'],
                          'prodcode': self.prodcode})
-            region.meta[band - start] = json.dumps(meta)
+            region.meta[index] = json.dumps(meta)
+            self.pending_sources.append((self.times[band], source))
+
+        self.pending.extend(targets)
+        return True
+
+    def exceeds(self):
+        """ Return if the pending batch exceeds the budget for a lock. """
+        if not self.pending_bytes:
+            return False
+        if self.pending_bytes >= self.batch_bytes:
+            return True
+        if self.plan is not None:
+            return False  # planning takes no time worth mentioning
+        return time.monotonic() - self.locked >= self.batch_seconds
+
+    def write(self):
+        """
+        Write the pending regions into the store in a single update.
 
-        message = 'Store {} source(s) into {}/{} ({} - {}).'
+        Returns True if the store was updated.
+        """
+        if not self.pending_bytes:
+            if self.plan is None:
+                self.mtimes.flush()
+            return False
+        if self.plan is not None:
+            self.plan['updates'] += 1
+            self.pending_bytes = 0
+            return True
+
+        start = min(region.time[0] for region in self.pending)
+        stop = max(region.time[-1] for region in self.pending)
+        message = 'Store {} source(s) in {} region(s) into {}/{} ({} - {}).'
         logger.info(message.format(
-            len(self.sources),
+            len(self.pending_sources),
+            len(self.pending),
             self.names['group'],
             self.names['store'],
-            region.time[0],
-            region.time[-1],
+            start,
+            stop,
         ))
-        self.store.update([region])
+        self.store.update(self.pending)
+        self.log_availability()
+        meta_cache = utils.get_meta_cache()
+        for region in self.pending:
+            meta_cache.invalidate(
+                name=self.names['group'],
+                start=region.time[0],
+                stop=region.time[-1],
+            )
+
+        # remember what is stored now
+        for datetime, source in self.pending_sources:
+            self.mtimes.set(
+                source['path'], mtime=source['mtime'], level=self.level,
+            )
+        self.mtimes.flush()
+
+        self.pending = []
+        self.pending_sources = []
+        self.pending_bytes = 0
         return True
 
+    def count(self):
+        """ Count in plan what offload would do. """
+        bands = len(self.sources)
+        itemsize = np.dtype(self.store.dtype).itemsize
+        self.plan['products'] += bands
+        self.plan['regions'] += len(utils.get_runs(self.sources))
+        self.plan['bands'] += bands
+        self.plan['read'] += sum(get_size(source['path'], index=self.index)
+                                 for source in self.sources.values())
+        self.plan['written'] += bands * SHAPE[0] * SHAPE[1] * itemsize
+        return True
+
+    def log_availability(self):
+        """ Log time between modification and storage of pending sources. """
+        now = Datetime.now()
+        delays = []
+        for datetime, source in sorted(self.pending_sources,
+                                       key=lambda item: item[0]):
+            # the mtime has a second added to it
+            modified = ciso8601.parse_datetime_unaware(source['mtime'])
+            delay = (now - modified).total_seconds() + 1
+            delays.append(delay)
+            logger.debug('available after {:.1f} s: {} {} {}'.format(
+                delay, datetime, self.timeframe, self.prodcode,
+            ))
+        logger.info('Time to availability {:.1f} - {:.1f} s.'.format(
+            min(delays), max(delays),
+        ))
+
     def consider(self, datetime):
         """ Consider a matching product for loading. """
         # logging fields
@@ -213,10 +389,18 @@ class Store(object):
             logger.debug('store has better: {d} {t} {p}'.format(**fields))
             return
 
-        # discard unavailable products
+        # skip products known to be stored, without touching the share;
+        # re-deliveries under the same path wait for the record to expire
         path = self.helper.path(datetime)
+        cached = self.mtimes.get(path) if self.scan else None
+        if cached and cached['level'] == group_level == self.level:
+            if cached['mtime'] <= group_mtime:
+                logger.debug('present (cached): {d} {t} {p}'.format(**fields))
+                return
+
+        # discard unavailable products
         try:
-            mtime = get_mtime(path)
+            mtime = get_mtime(path, index=self.index)
         except OSError:
             logger.debug('not on disk: {d} {t} {p}'.format(**fields))
             return
@@ -225,39 +409,192 @@ class Store(object):
         if self.level == group_level:
             if mtime <= group_mtime:
                 logger.debug('present: {d} {t} {p}'.format(**fields))
+                self.mtimes.set(path, mtime=mtime, level=group_level)
                 return
 
         # add to sources
         logger.debug('staging: {d} {t} {p}'.format(**fields))
         self.sources[self.bands[datetime]] = {'path': path, 'mtime': mtime}
 
-    def process(self, period):
+    def process(self, period, newest_first=False):
         """
         Controls offloading and filters according to timeframe.
         on start: init according to datetime
-        on edge: init and offload
-        on finish: offload
+        on edge: init and offload, write if the batch exceeds the budget
+        on finish: offload and write
+
+        With newest_first, chunks are processed from new to old and written
+        one by one, without batching, so that the newest is available first
+        and other jobs get their turn after every chunk.
         """
         datetimes = (d
                      for d in period
                      if self.timeframe in utils.get_valid_timeframes(d))
+        if newest_first:
+            chunks = {}
+            for datetime in datetimes:
+                chunk = self.get_chunk(datetime)
+                chunks.setdefault(chunk, []).append(datetime)
+            datetimes = (d
+                         for c in sorted(chunks, reverse=True)
+                         for d in chunks[c])
         # grab first datetime if any, reset band index, meta accordingly
         try:
             first = next(datetimes)
         except StopIteration:
             return
+        self.locked = time.monotonic()
         self.reset(first)
         self.consider(first)
         for datetime in datetimes:
             if datetime not in self.bands:
-                if self.offload():
+                self.offload()
+                if (newest_first or self.exceeds()) and self.write():
                     yield  # makes unlocking possible here
+                    self.locked = time.monotonic()
                 self.reset(datetime)
             self.consider(datetime)
         self.offload()
+        self.write()
+
+
+def get_job(timeframe, prodcode, datetimes, newest_first=False, **kwargs):
+    """
+    Return (resource, label, processor) tuple for storing datetimes.
+
+    Further keyword arguments are passed to Store.
+    """
+    resource = NAMES[timeframe][prodcode]['group']
+    label = 'store: {}'.format(PRODUCTS[prodcode])
+    store = Store(timeframe=timeframe, prodcode=prodcode, **kwargs)
+    processor = store.process(datetimes, newest_first=newest_first)
+    return resource, label, processor
+
+
+def run_jobs(locker, jobs):
+    """
+    Run store jobs, taking turns after every batch of store updates.
+
+    :param locker: turn.Locker instance
+    :param jobs: iterable of (resource, label, processor) tuples
+    """
+    jobs = list(jobs)
+    while jobs:
+        for job in list(jobs):
+            resource, label, processor = job
+            with locker.lock(resource=resource, label=label):
+                try:
+                    # processor will yield if a store was updated
+                    next(processor)
+                except StopIteration:
+                    jobs.remove(job)
+
+
+def store_datetimes(locker, timeframe, prodcode, datetimes, **kwargs):
+    """
+    Store radar images for datetimes, locking the group per chunk.
+
+    :param locker: turn.Locker instance
+    :param datetimes: iterable of ascending datetimes
+
+    Further keyword arguments are passed to Store.
+    """
+    job = get_job(
+        timeframe=timeframe, prodcode=prodcode, datetimes=datetimes, **kwargs
+    )
+    run_jobs(locker=locker, jobs=[job])
+
+
+def store_timeframe(timeframe, period, delivery, prodcodes, latency=False,
+                    **kwargs):
+    """
+    Store radar images of a timeframe, one prodcode after another.
+
+    With latency, the realtime and near-realtime products are stored first,
+    alternating per chunk, and starting with the newest chunk; those chunks
+    are not batched.
 
+    Further keyword arguments are passed to Store.
+    """
+    locker = turn.Locker(host=config.REDIS_HOST_TURN)
+
+    def get_datetimes(prodcode):
+        # determine offset for datetimes
+        offset = -DELIVERY_TIMES[prodcode] if delivery else Timedelta(0)
+        return (d + offset for d in period)
+
+    if latency:
+        run_jobs(locker=locker, jobs=[get_job(
+            timeframe=timeframe,
+            prodcode=prodcode,
+            datetimes=get_datetimes(prodcode),
+            newest_first=True,
+            **kwargs
+        ) for prodcode in prodcodes if prodcode in REALTIME])
+        prodcodes = [p for p in prodcodes if p not in REALTIME]
+
+    for prodcode in prodcodes:  # use reversed order
+        store_datetimes(
+            locker=locker,
+            timeframe=timeframe,
+            prodcode=prodcode,
+            datetimes=get_datetimes(prodcode),
+            **kwargs
+        )
+
+
+def plan_timeframe(timeframe, period, delivery, prodcodes, **kwargs):
+    """
+    Return dictionary of plans per prodcode for a timeframe.
+
+    The plans count the products that would be staged, the regions and bands
+    and the estimated uncompressed bytes that would be written, the bytes
+    that would be read and the number of lock acquisitions. As the store is
+    not actually changed, products that would be superseded by others in
+    the same run are counted too, and updates are estimated from the byte
+    budget only.
 
-def command(text, delivery, timeframes, prodcodes):
+    Further keyword arguments are passed to Store.
+    """
+    plans = {}
+    for prodcode in prodcodes:
+        offset = -DELIVERY_TIMES[prodcode] if delivery else Timedelta(0)
+        plan = dict.fromkeys(
+            ('products', 'regions', 'bands', 'read', 'written', 'updates'), 0,
+        )
+        store = Store(
+            timeframe=timeframe, prodcode=prodcode, plan=plan, **kwargs
+        )
+        # like run_jobs, lock for the first batch and after every yield
+        processor = store.process(d + offset for d in period)
+        plan['locks'] = 1 + sum(1 for _ in processor)
+        plans[prodcode] = plan
+    return plans
+
+
+def print_plans(plans):
+    """ Print a table with plans per timeframe and prodcode. """
+    template = '{:>9} {:>8} {:>9} {:>7} {:>6} {:>10} {:>10} {:>6}'
+    print(template.format('timeframe', 'prodcode', 'products', 'regions',
+                          'bands', 'read MB', 'write MB', 'locks'))
+    for timeframe, timeframe_plans in plans.items():
+        for prodcode, plan in timeframe_plans.items():
+            print(template.format(
+                timeframe,
+                prodcode,
+                plan['products'],
+                plan['regions'],
+                plan['bands'],
+                '{:.1f}'.format(plan['read'] / 1e6),
+                '{:.1f}'.format(plan['written'] / 1e6),
+                plan['locks'],
+            ))
+
+
+def command(text, delivery, timeframes, prodcodes,
+            threads=config.STORE_THREADS, parallel=False, latency=False,
+            plan=False, batch_bytes=config.STORE_BATCH_BYTES,
+            batch_seconds=config.STORE_BATCH_SECONDS):
     """ Store radar images in a dedicated group of raster stores. """
     # parse text and log something useful
     period = periods.Period(text)
@@ -270,25 +607,38 @@ def command(text, delivery, timeframes, prodcodes):
     )
     logger.info(message)
 
-    locker = turn.Locker(host=config.REDIS_HOST_TURN)
-    for timeframe in timeframes:
-        for prodcode in prodcodes:  # use reversed order
-
-            # determine offset for datetimes
-            offset = -DELIVERY_TIMES[prodcode] if delivery else Timedelta(0)
-
-            resource = NAMES[timeframe][prodcode]['group']
-            label = 'store: {}'.format(PRODUCTS[prodcode])
-            kwargs = {'timeframe': timeframe, 'prodcode': prodcode}
-            store = Store(**kwargs)
-            processor = store.process(d + offset for d in period)
-            while True:
-                with locker.lock(resource=resource, label=label):
-                    try:
-                        # processor will yield if a store was updated
-                        next(processor)
-                    except StopIteration:
-                        break
+    # other processes may have written since a previous run in this process
+    utils.get_meta_cache().clear()
+
+    if plan:
+        print_plans({timeframe: plan_timeframe(
+            timeframe=timeframe,
+            period=period,
+            delivery=delivery,
+            prodcodes=prodcodes,
+            batch_bytes=batch_bytes,
+        ) for timeframe in timeframes})
+        return
+
+    kwargs = {
+        'period': period,
+        'delivery': delivery,
+        'prodcodes': prodcodes,
+        'threads': threads,
+        'latency': latency,
+        'batch_bytes': batch_bytes,
+        'batch_seconds': batch_seconds,
+    }
+    if parallel and len(timeframes) > 1:
+        # timeframes lock separate resources and write to separate groups
+        with ProcessPoolExecutor(max_workers=len(timeframes)) as executor:
+            futures = [executor.submit(store_timeframe, timeframe, **kwargs)
+                       for timeframe in timeframes]
+        for future in futures:
+            future.result()
+    else:
+        for timeframe in timeframes:
+            store_timeframe(timeframe, **kwargs)
     logger.info('Store procedure completed.')
 
 
@@ -323,6 +673,39 @@ def get_parser():
         default='uanr',
         help='Restrict these prodcodes.',
     )
+    parser.add_argument(
+        '-j', '--threads',
+        type=int,
+        default=config.STORE_THREADS,
+        help='Number of products to read concurrently.',
+    )
+    parser.add_argument(
+        '-P', '--parallel',
+        action='store_true',
+        help='Process the timeframes in parallel worker processes.',
+    )
+    parser.add_argument(
+        '-l', '--latency',
+        action='store_true',
+        help='Store realtime products first, newest first.',
+    )
+    parser.add_argument(
+        '--plan',
+        action='store_true',
+        help='Report the expected work instead of storing anything.',
+    )
+    parser.add_argument(
+        '-b', '--batch-bytes',
+        type=int,
+        default=config.STORE_BATCH_BYTES,
+        help='Uncompressed bytes to write per lock acquisition.',
+    )
+    parser.add_argument(
+        '-s', '--batch-seconds',
+        type=float,
+        default=config.STORE_BATCH_SECONDS,
+        help='Seconds to hold a lock before writing and releasing it.',
+    )
 
     return parser
 
@@ -330,6 +713,7 @@ def get_parser():
 def main():
     """ Call command with args from parser. """
     kwargs = vars(get_parser().parse_args())
+    setup()
 
     # logging
     if kwargs.pop('verbose'):
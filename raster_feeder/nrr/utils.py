@@ -2,13 +2,24 @@
 # (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
 
 from os.path import join
+import os
 
 from datetime import datetime as Datetime
 from datetime import timedelta as Timedelta
+import collections
+import functools
+import json
 
 from . import config
 
 
+@functools.lru_cache()
+def get_wkt(projection=config.PROJECTION):
+    """ Return projection as WKT, importing GDAL only when needed. """
+    from osgeo import osr
+    return osr.GetUserInputAsWKT(str(projection))
+
+
 # path helpers
 class PathHelper(object):
     """
@@ -29,12 +40,17 @@ class PathHelper(object):
         self._code = code
         self._template = template
 
-    def path(self, dt):
+    def directory(self, dt):
         return join(
             self._basedir,
             dt.strftime('%Y'),
             dt.strftime('%m'),
             dt.strftime('%d'),
+        )
+
+    def path(self, dt):
+        return join(
+            self.directory(dt),
             self._template.format(
                 code=self._code,
                 timestamp=dt.strftime(self.TIMESTAMP_FORMAT)
@@ -55,6 +71,312 @@ class PathHelper(object):
         )
 
 
+class DirectoryIndex(object):
+    """
+    In-memory index of file modification times and sizes, filled per
+    directory.
+
+    Every directory is listed only once, on the first request for a path in
+    it, so that products that are not there cost no remote stat on network
+    shares. Files that are there are stat'ed once, on their first request.
+    """
+    def __init__(self):
+        self._listings = {}  # directory: set of names
+        self._stats = {}  # path: (mtime, size)
+
+    def scan(self, directory):
+        """ Return set of the names in directory, without stat'ing them. """
+        try:
+            with os.scandir(directory) as entries:
+                return {e.name for e in entries}
+        except FileNotFoundError:
+            return set()
+
+    def _list(self, directory):
+        try:
+            return self._listings[directory]
+        except KeyError:
+            listing = self._listings[directory] = self.scan(directory)
+            return listing
+
+    def exists(self, path):
+        """ Like os.path.exists, but from the index. """
+        directory, name = os.path.split(path)
+        return name in self._list(directory)
+
+    def _get(self, path):
+        try:
+            return self._stats[path]
+        except KeyError:
+            pass
+        if not self.exists(path):
+            raise FileNotFoundError(path)
+        stat = os.stat(path)
+        self._stats[path] = stat.st_mtime, stat.st_size
+        return self._stats[path]
+
+    def getmtime(self, path):
+        """ Like os.path.getmtime, but from the index. """
+        return self._get(path)[0]
+
+    def getsize(self, path):
+        """ Like os.path.getsize, but from the index. """
+        return self._get(path)[1]
+
+
+def get_redis():
+    """ Return redis client for the nrr caches. """
+    import redis
+
+    return redis.Redis(
+        host=config.REDIS_HOST,
+        db=config.REDIS_DB,
+        password=config.REDIS_PASSWORD,
+        decode_responses=True,
+    )
+
+
+class MtimeCache(object):
+    """
+    Redis cache of mtime and level of product files that are in the store.
+
+    Records are fetched and written in bulk using pipelines, and expire after
+    ttl seconds, after which the product file is looked at again.
+    """
+    PREFIX = 'raster-feeder:nrr:mtime:'
+
+    def __init__(self, ttl):
+        self.client = get_redis()
+        self.ttl = ttl
+        self._records = {}
+        self._pending = {}
+
+    def load(self, paths):
+        """ Replace the records in memory by those for paths. """
+        pipeline = self.client.pipeline(transaction=False)
+        for path in paths:
+            pipeline.hgetall(self.PREFIX + path)
+        self._records = {
+            path: {'mtime': record['mtime'], 'level': int(record['level'])}
+            for path, record in zip(paths, pipeline.execute()) if record
+        }
+
+    def get(self, path):
+        """ Return record dictionary or None. """
+        return self._records.get(path)
+
+    def set(self, path, mtime, level):
+        """ Set record, to be written on the next flush. """
+        record = {'mtime': mtime, 'level': level}
+        self._records[path] = record
+        self._pending[path] = record
+
+    def flush(self):
+        """ Write pending records to redis. """
+        if not self._pending:
+            return
+        pipeline = self.client.pipeline(transaction=False)
+        for path, record in self._pending.items():
+            pipeline.hset(self.PREFIX + path, mapping=record)
+            pipeline.expire(self.PREFIX + path, self.ttl)
+        pipeline.execute()
+        self._pending = {}
+
+
+class MetaCache(object):
+    """
+    Cache of group meta per chunk, in memory and optionally in redis.
+
+    Entries are tagged with generation counters for the days they cover.
+    Writing to a group should be reported via invalidate(), which increments
+    the counters for the days written to, so that entries covering those
+    days are no longer used. Without ttl the counters are kept in memory
+    and only writes from this process are noticed.
+    """
+    PREFIX = 'raster-feeder:nrr:meta:'
+
+    def __init__(self, size, ttl=None):
+        self.size = size
+        self.ttl = ttl
+        self.client = get_redis() if ttl else None
+        self._entries = collections.OrderedDict()
+        self._generations = collections.Counter()
+
+    def _get_days(self, start, stop):
+        day = start.date()
+        while day <= stop.date():
+            yield day.strftime('%Y%m%d')
+            day += Timedelta(days=1)
+
+    def _get_key(self, name, start, stop):
+        return '{}{}:{}:{}'.format(
+            self.PREFIX, name, start.isoformat(), stop.isoformat(),
+        )
+
+    def _get_generation_keys(self, name, start, stop):
+        return ['{}{}:generation:{}'.format(self.PREFIX, name, day)
+                for day in self._get_days(start, stop)]
+
+    def clear(self):
+        """ Drop the entries in memory. """
+        self._entries.clear()
+
+    def get_meta(self, name, group, dates):
+        """
+        Return meta dictionary for a chunk, like group.get_meta().
+
+        :param name: name of the group, to key the cache with
+        :param group: GeoInterface for the group
+        :param dates: datetimes of the chunk bands
+        """
+        start, stop = dates[0], dates[-1]
+        key = self._get_key(name, start, stop)
+        generation_keys = self._get_generation_keys(name, start, stop)
+
+        # determine current generations and look for a stored entry
+        entry = self._entries.get(key)
+        if self.client is None:
+            generations = [self._generations[k] for k in generation_keys]
+        else:
+            pipeline = self.client.pipeline(transaction=False)
+            pipeline.mget(generation_keys)
+            if entry is None:
+                pipeline.get(key)
+            values = pipeline.execute()
+            generations = [int(g or 0) for g in values[0]]
+            if entry is None and values[1] is not None:
+                entry = json.loads(values[1])
+
+        if entry is not None and entry['generations'] == generations:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            return dict(zip(dates, entry['metas']))
+
+        # fetch and store
+        meta = group.get_meta(start=start.isoformat(), stop=stop.isoformat())
+        entry = {'generations': generations,
+                 'metas': [meta.get(d) for d in dates]}
+        self._entries[key] = entry
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+        if self.client is not None:
+            self.client.set(key, json.dumps(entry), ex=self.ttl)
+        return meta
+
+    def invalidate(self, name, start, stop):
+        """ Report a write to group name between start and stop. """
+        generation_keys = self._get_generation_keys(name, start, stop)
+        if self.client is None:
+            self._generations.update(generation_keys)
+            return
+        # counters outlive the entries that refer to them
+        pipeline = self.client.pipeline(transaction=False)
+        for generation_key in generation_keys:
+            pipeline.incr(generation_key)
+            pipeline.expire(generation_key, 2 * self.ttl)
+        pipeline.execute()
+
+
+@functools.lru_cache()
+def get_meta_cache():
+    """ Return the meta cache shared in this process. """
+    return MetaCache(size=config.META_CACHE_SIZE, ttl=config.META_CACHE_TTL)
+
+
+def get_runs(bands):
+    """
+    Return sorted list of (start, stop) tuples of consecutive bands.
+
+        >>> get_runs([7, 1, 2, 3, 5])
+        [(1, 3), (5, 5), (7, 7)]
+    """
+    runs = []
+    for band in sorted(bands):
+        if runs and runs[-1][1] == band - 1:
+            runs[-1] = runs[-1][0], band
+        else:
+            runs.append((band, band))
+    return runs
+
+
+class Journal(object):
+    """
+    Write-ahead journal of the chunks moved from one store to another.
+
+    Each chunk passes the states copied and deleted, optionally preceded by
+    planned. A state is
+    recorded and synced to disk before the next step is taken, so that a
+    move that died partway can continue where it was. A record may carry a
+    fingerprint of the chunk, to tell whether it changed since. Records are
+    json lines; a record that was cut short at the end of the file is
+    dropped.
+    """
+    PLANNED = 'planned'
+    COPIED = 'copied'
+    DELETED = 'deleted'
+
+    def __init__(self, path):
+        self.path = path
+        self._states = {}  # (start, stop): state of unfinished chunks
+        self._fingerprints = {}  # (start, stop): fingerprint of the state
+        try:
+            with open(path) as f:
+                text = f.read()
+        except FileNotFoundError:
+            return
+
+        complete, _, torn = text.rpartition('\n')
+        if torn:
+            with open(path, 'r+') as f:
+                f.truncate(len(complete) + 1 if complete else 0)
+        for line in complete.splitlines():
+            record = json.loads(line)
+            self._update(record)
+
+    def _update(self, record):
+        key = record['start'], record['stop']
+        if record['state'] == self.DELETED:
+            self._states.pop(key, None)
+            self._fingerprints.pop(key, None)
+        else:
+            self._states[key] = record['state']
+            self._fingerprints[key] = record.get('fingerprint')
+
+    def __bool__(self):
+        """ Return if there are unfinished chunks. """
+        return bool(self._states)
+
+    def get(self, start, stop):
+        """ Return state of the chunk from start to stop or None. """
+        return self._states.get((start.isoformat(), stop.isoformat()))
+
+    def get_fingerprint(self, start, stop):
+        """ Return fingerprint recorded with the state of a chunk or None. """
+        return self._fingerprints.get((start.isoformat(), stop.isoformat()))
+
+    def record(self, start, stop, state, fingerprint=None):
+        """ Append the state of a chunk to the journal. """
+        record = {'start': start.isoformat(),
+                  'stop': stop.isoformat(),
+                  'state': state}
+        if fingerprint is not None:
+            record['fingerprint'] = fingerprint
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._update(record)
+
+    def remove(self):
+        """ Remove the journal, for example when a move has completed. """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self._states = {}
+        self._fingerprints = {}
+
+
 # Timing
 def closest_time(timeframe='f', dt_close=None):
     '''
@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+"""
+Watch the nrr data directories and store products as soon as they arrive.
+
+On startup, products from a recent delivery period are stored first. On
+systems without inotify, that is repeated at a fixed interval instead.
+"""
+
+from datetime import datetime as Datetime
+from datetime import timedelta as Timedelta
+from os.path import basename, dirname, isfile, join
+import argparse
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import time
+
+import turn
+
+from . import config
+from . import store
+from . import utils
+from .. import setup
+
+logger = logging.getLogger(__name__)
+
+# inotify constants from sys/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = os.O_CLOEXEC
+IN_ONLYDIR = 0x01000000
+
+# event struct: int wd, uint32 mask, uint32 cookie, uint32 len, char name[]
+EVENT = struct.Struct('iIII')
+
+# product file name prefix and suffix per product code
+CODES = {code: (timeframe, prodcode)
+         for timeframe, codes in config.PRODUCT_CODE.items()
+         for prodcode, code in codes.items()}
+AFFIXES = {code: config.PRODUCT_TEMPLATE.format(
+    code=code, timestamp='\0').split('\0') for code in CODES}
+
+
+def parse_path(path):
+    """
+    Return (timeframe, prodcode, datetime) tuple or None.
+
+    Only products in the location where the store looks for them qualify.
+    """
+    name = basename(path)
+    for code, (prefix, suffix) in AFFIXES.items():
+        if name.startswith(prefix) and name.endswith(suffix):
+            timestamp = name[len(prefix):len(name) - len(suffix)]
+            try:
+                datetime = Datetime.strptime(timestamp,
+                                             config.TIMESTAMP_FORMAT)
+            except ValueError:
+                return
+            timeframe, prodcode = CODES[code]
+            helper = store.get_path_helper(timeframe, prodcode)
+            if helper.path(datetime) != path:
+                return
+            return timeframe, prodcode, datetime
+
+
+class Inotify(object):
+    """ Minimal inotify interface using ctypes. """
+    def __init__(self):
+        name = ctypes.util.find_library('c')
+        self.libc = ctypes.CDLL(name, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.paths = {}
+
+    def add_watch(self, path, mask):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        self.paths[wd] = path
+        return wd
+
+    def remove_watch(self, wd):
+        # the kernel already removed watches of deleted directories
+        self.libc.inotify_rm_watch(self.fd, wd)
+        self.paths.pop(wd, None)
+
+    def read(self, timeout):
+        """
+        Return list of (path, mask) tuples.
+
+        :param timeout: seconds to wait for events
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        data = os.read(self.fd, 1 << 16)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, size = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            name = os.fsdecode(data[offset:offset + size].rstrip(b'\0'))
+            offset += size
+            path = join(self.paths[wd], name) if wd in self.paths else None
+            events.append((path, mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Watcher(object):
+    """
+    Collects product paths from inotify events on the data directories.
+
+    The day directories of a product code are watched from the delivery time
+    of the product code plus a margin ago up to now, as well as the month,
+    year, product code and base directories above them, to notice new
+    directories.
+    Watches on directories that fall out of that window are removed when
+    refreshing.
+    """
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, clock=Datetime.utcnow):
+        self.inotify = Inotify()
+        self.clock = clock
+        self.watches = {}  # path: watch descriptor
+        self.refresh()
+
+    def get_directories(self, now):
+        """ Return set of directories that may still receive products. """
+        directories = set()
+        for timeframe, prodcode in CODES.values():
+            helper = store.get_path_helper(timeframe, prodcode)
+            window = store.DELIVERY_TIMES[prodcode] + config.WATCH_MARGIN
+            day = (now - window).replace(hour=0, minute=0, second=0,
+                                         microsecond=0)
+            while day <= now:
+                path = helper.directory(day)
+                for _ in range(5):  # day, month, year, code and base
+                    directories.add(path)
+                    path = dirname(path)
+                day += Timedelta(days=1)
+        return directories
+
+    def refresh(self, now=None):
+        """
+        Update the watches and return paths of files in new watches.
+
+        Files may have arrived in new directories before they were watched.
+        """
+        if now is None:
+            now = self.clock()
+        directories = self.get_directories(now)
+        for path in set(self.watches) - directories:
+            self.inotify.remove_watch(self.watches.pop(path))
+
+        # parents sort before their subdirectories
+        paths = []
+        for path in sorted(directories - set(self.watches)):
+            try:
+                wd = self.inotify.add_watch(path, self.MASK | IN_ONLYDIR)
+            except OSError:
+                continue  # the watched parent reports when it appears
+            self.watches[path] = wd
+            for name in sorted(os.listdir(path)):
+                if isfile(join(path, name)):
+                    paths.append(join(path, name))
+        return paths
+
+    def read(self, timeout):
+        """
+        Return tuple (paths, overflow).
+
+        Overflow is True if the kernel dropped events, in which case the
+        directories should be scanned.
+        """
+        paths = []
+        overflow = False
+        for path, mask in self.inotify.read(timeout):
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+            elif path is None:
+                continue
+            elif mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    paths.extend(self.refresh())
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                paths.append(path)
+        return paths, overflow
+
+
+def process(locker, paths, threads):
+    """ Store the products at paths, per timeframe and prodcode. """
+    products = {}
+    for path in paths:
+        parsed = parse_path(path)
+        if parsed is None:
+            continue
+        timeframe, prodcode, datetime = parsed
+        products.setdefault((timeframe, prodcode), set()).add(datetime)
+    if not products:
+        return
+
+    utils.get_meta_cache().clear()
+    for timeframe in 'fhd':
+        for prodcode in 'uanr':
+            datetimes = products.get((timeframe, prodcode))
+            if not datetimes:
+                continue
+            logger.info('Store {} {}/{} product(s).'.format(
+                len(datetimes), timeframe, prodcode,
+            ))
+            store.store_datetimes(
+                locker=locker,
+                timeframe=timeframe,
+                prodcode=prodcode,
+                datetimes=sorted(datetimes),
+                threads=threads,
+                scan=False,
+            )
+
+
+def scan(text, threads):
+    """ Store products from a recent delivery period. """
+    store.command(
+        text=text,
+        delivery=True,
+        timeframes='fhd',
+        prodcodes='uanr',
+        threads=threads,
+    )
+
+
+def command(wait, text, interval, threads):
+    """
+    Store products as they arrive.
+
+    :param wait: seconds to collect further events once one arrived
+    :param text: delivery period to scan on startup, without inotify or
+        after overflow
+    :param interval: seconds between scans without inotify or without
+        events, and between refreshes of the watches
+    :param threads: number of products to read concurrently
+    """
+    try:
+        watcher = Watcher()
+    except (AttributeError, OSError):
+        logger.exception('No inotify, falling back to periodic scanning.')
+        while True:
+            start = time.monotonic()
+            try:
+                scan(text=text, threads=threads)
+            except Exception:
+                logger.exception('Scan failed.')
+            time.sleep(max(0, interval - (time.monotonic() - start)))
+
+    # products may have arrived while not watching
+    logger.info('Watching for products.')
+    try:
+        scan(text=text, threads=threads)
+    except Exception:
+        logger.exception('Scan failed.')
+
+    locker = turn.Locker(host=config.REDIS_HOST_TURN)
+    scanned = time.monotonic()
+    while True:
+        # block until something happens, then collect a micro-batch
+        paths, overflow = watcher.read(timeout=interval)
+        paths.extend(watcher.refresh())
+        if not paths and not overflow:
+            if time.monotonic() - scanned < interval:
+                continue
+            # network shares do not report files written by other hosts
+            logger.info('No products for {} s, scanning.'.format(interval))
+            try:
+                scan(text=text, threads=threads)
+            except Exception:
+                logger.exception('Scan failed.')
+            scanned = time.monotonic()
+            continue
+        scanned = time.monotonic()
+        deadline = time.monotonic() + wait
+        while True:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            more_paths, more_overflow = watcher.read(timeout=timeout)
+            paths.extend(more_paths)
+            overflow |= more_overflow
+
+        try:
+            if overflow:
+                logger.warning('Events were dropped, scanning instead.')
+                scan(text=text, threads=threads)
+            else:
+                process(locker=locker, paths=paths, threads=threads)
+        except Exception:
+            logger.exception('Storing a batch of products failed.')
+
+
+def get_parser():
+    """ Return argument parser. """
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        '-v', '--verbose',
+        action='store_true',
+    )
+    parser.add_argument(
+        '-w', '--wait',
+        type=float,
+        default=config.WATCH_WAIT,
+        help='Seconds to collect products into a single batch.',
+    )
+    parser.add_argument(
+        '-p', '--period',
+        dest='text',
+        metavar='PERIOD',
+        default=config.WATCH_PERIOD,
+        help='Delivery period to scan on startup and without events.',
+    )
+    parser.add_argument(
+        '-i', '--interval',
+        type=float,
+        default=config.WATCH_INTERVAL,
+        help='Seconds between scans when no events arrive.',
+    )
+    parser.add_argument(
+        '-j', '--threads',
+        type=int,
+        default=config.STORE_THREADS,
+        help='Number of products to read concurrently.',
+    )
+    return parser
+
+
+def main():
+    """ Call command with args from parser. """
+    kwargs = vars(get_parser().parse_args())
+    setup()
+
+    # logging
+    if kwargs.pop('verbose'):
+        basic = {'stream': sys.stderr,
+                 'level': logging.INFO,
+                 'format': '%(message)s'}
+    else:
+        basic = {'level': logging.INFO,
+                 'format': '%(asctime)s %(levelname)s %(message)s',
+                 'filename': join(config.LOG_DIR, 'nrr_watch.log')}
+    logging.basicConfig(**basic)
+
+    # run
+    try:
+        command(**kwargs)
+    except Exception:
+        logger.exception('An exception occurred:')
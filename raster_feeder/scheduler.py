@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+"""
+Run the feeder commands on configured intervals in a single process.
+
+Jobs are configured with the SCHEDULE setting in the central config, for
+example in localconfig.py::
+
+    SCHEDULE = [{
+        'name': 'nowcast',
+        'target': 'raster_feeder.nowcast.rotate:rotate_nowcast',
+        'interval': 300,
+        'jitter': 10,
+    }, {
+        'name': 'nrr-store',
+        'target': 'raster_feeder.nrr.store:command',
+        'kwargs': {'text': '3h', 'delivery': True,
+                   'timeframes': 'fhd', 'prodcodes': 'uanr'},
+        'interval': 300,
+        'isolate': True,
+    }]
+
+Intervals and jitter are in seconds. Isolated jobs are run in a worker
+process, forked from a server process that has imported their modules and
+those of the stores, others in a thread. A job is never started while its
+previous run has not yet finished. On shutdown, worker processes are
+terminated.
+"""
+
+from os.path import join
+
+import argparse
+import importlib
+import logging
+import multiprocessing
+import random
+import signal
+import sys
+import threading
+import time
+
+from . import config
+from . import setup
+
+logger = logging.getLogger(__name__)
+
+# workers are started from a clean server process, because forking this
+# one could copy locks held by the threads of other jobs
+CONTEXT = multiprocessing.get_context('forkserver')
+
+# modules that setup() imports
+SETUP_MODULES = ['osgeo.gdal', 'osgeo.osr', 'redis', 'raster_store.cache']
+
+# logging configuration for worker processes, set by main()
+LOGGING = {'level': logging.INFO}
+
+
+def resolve(target):
+    """ Return callable for a 'package.module:function' string. """
+    module_name, func_name = target.split(':')
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def call(name, func, kwargs):
+    """ Call func, logging instead of raising any exception. """
+    logger.info('Job %s started.', name)
+    start = time.monotonic()
+    try:
+        func(**kwargs)
+    except Exception:
+        logger.exception('Job %s failed.', name)
+        return
+    logger.info(
+        'Job %s completed in %.1f s.', name, time.monotonic() - start,
+    )
+
+
+def get_preload(jobs):
+    """
+    Return names of the modules for the server process to import, so that
+    the workers forked from it do not import them on every run.
+    """
+    names = ['raster_feeder'] + SETUP_MODULES
+    if config.SENTRY_DSN:
+        names.append('sentry_sdk')
+    for job in jobs:
+        if job.isolate:
+            names.append(job.target.split(':')[0])
+    return names
+
+
+def isolated(name, target, kwargs, basic):
+    """ Initialize a worker process and call the target in it. """
+    logging.basicConfig(**basic)
+    setup()
+    call(name=name, func=resolve(target), kwargs=kwargs)
+
+
+class Job(object):
+    """ A command that is run periodically. """
+    def __init__(self, name, target, interval,
+                 kwargs=None, jitter=0, isolate=False):
+        self.name = name
+        self.target = target
+        self.func = resolve(target)
+        self.kwargs = {} if kwargs is None else kwargs
+        self.interval = interval
+        self.jitter = jitter
+        self.isolate = isolate
+
+        self.worker = None
+        self.due = time.monotonic() + random.uniform(0, jitter)
+
+    def running(self):
+        return self.worker is not None and self.worker.is_alive()
+
+    def start(self):
+        """ Start the job unless it is still running and schedule the next. """
+        self.due += self.interval + random.uniform(0, self.jitter)
+        if self.running():
+            logger.warning('Job %s still running, skipped.', self.name)
+            return
+
+        if self.isolate:
+            # not daemonic, so that the job can start worker processes, too
+            self.worker = CONTEXT.Process(
+                name=self.name,
+                target=isolated,
+                args=(self.name, self.target, self.kwargs, LOGGING),
+            )
+        else:
+            self.worker = threading.Thread(
+                name=self.name,
+                target=call,
+                args=(self.name, self.func, self.kwargs),
+                daemon=True,
+            )
+        self.worker.start()
+
+    def join(self):
+        if self.worker is not None:
+            self.worker.join()
+
+    def stop(self):
+        """ Terminate a running worker process and wait for the worker. """
+        if self.isolate and self.running():
+            logger.info('Job %s terminated.', self.name)
+            self.worker.terminate()
+        self.join()
+
+
+def schedule(jobs, resolution=1):
+    """
+    Start jobs when they are due.
+
+    :param jobs: Job instances
+    :param resolution: Maximum time in seconds to sleep between checks
+    """
+    logger.info('Scheduler started with %d job(s).', len(jobs))
+    try:
+        while True:
+            now = time.monotonic()
+            for job in jobs:
+                if job.due <= now:
+                    # catch up without starting a burst of runs
+                    job.due = max(job.due, now - job.interval)
+                    job.start()
+            wait = min(job.due for job in jobs) - time.monotonic()
+            time.sleep(min(max(wait, 0), resolution))
+    except KeyboardInterrupt:
+        logger.info('Scheduler interrupted, stopping running jobs.')
+        for job in jobs:
+            job.stop()
+    logger.info('Scheduler stopped.')
+
+
+def interrupt(signum, frame):
+    """ Handle termination like an interrupt. """
+    raise KeyboardInterrupt
+
+
+def get_parser():
+    """ Return argument parser. """
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        '-v', '--verbose',
+        action='store_true',
+    )
+    return parser
+
+
+def main():
+    """ Call schedule with jobs from config. """
+    kwargs = vars(get_parser().parse_args())
+
+    # logging
+    if kwargs.pop('verbose'):
+        basic = {'stream': sys.stderr,
+                 'level': logging.INFO,
+                 'format': '%(asctime)s %(threadName)s %(message)s'}
+    else:
+        basic = {'level': logging.INFO,
+                 'format': '%(asctime)s %(levelname)s %(message)s',
+                 'filename': join(config.LOG_DIR, 'scheduler.log')}
+    logging.basicConfig(**basic)
+    LOGGING.update({k: v for k, v in basic.items() if k != 'stream'})
+    signal.signal(signal.SIGTERM, interrupt)
+
+    # initialize once for all thread jobs
+    setup()
+    jobs = [Job(**job) for job in config.SCHEDULE]
+    if not jobs:
+        logger.info('No jobs configured, exiting.')
+        return
+    CONTEXT.set_forkserver_preload(get_preload(jobs))
+    schedule(jobs)
@@ -5,7 +5,6 @@ Stores latest steps in a rotating raster store group.
 """
 
 import argparse
-import contextlib
 import json
 import logging
 import os
@@ -21,24 +20,12 @@ from osgeo import osr, ogr, gdal
 from raster_store import load
 from raster_store import regions
 
-from ..common import rotate, touch_lizard, FTPServer
+from ..common import rotate, touch_lizard, FTPServer, Pipeline, Stage
 from . import config
+from .. import setup
 
 logger = logging.getLogger(__name__)
 
-EPSG32756 = osr.SpatialReference()
-EPSG32756.ImportFromEPSG(32756)
-
-
-@contextlib.contextmanager
-def mkdtemp(*args, **kwargs):
-    """ Self-cleaning tempdir. """
-    dtemp = tempfile.mkdtemp(*args, **kwargs)
-    try:
-        yield dtemp
-    finally:
-        shutil.rmtree(dtemp)
-
 
 def extract_region(path, percentile):
     """
@@ -70,6 +57,8 @@ def extract_region(path, percentile):
     # transform the region of interest to indices in the array
 
     # create the geometry
+    epsg32756 = osr.SpatialReference()
+    epsg32756.ImportFromEPSG(32756)
     x1, y1, x2, y2 = config.ROI_ESPG32756
     ring = ogr.Geometry(ogr.wkbLinearRing)
     poly = ogr.Geometry(ogr.wkbPolygon)
@@ -79,7 +68,7 @@ def extract_region(path, percentile):
     ring.AddPoint(x1, y2)
     ring.AddPoint(x1, y1)
     poly.AddGeometry(ring)
-    poly.AssignSpatialReference(EPSG32756)
+    poly.AssignSpatialReference(epsg32756)
 
     # transform the geometry to native projection
     target = osr.SpatialReference()
@@ -158,22 +147,43 @@ def rotate_steps():
         logger.info('No update available, exiting.')
         return
 
-    # download and process the file
-    try:
-        with mkdtemp() as tdir:
-            path = os.path.join(tdir, latest)
-            server.retrieve_to_path(name=latest, path=path)
-            region = extract_region(path=path, percentile=config.PERCENTILE)
-    except Exception:
-        logger.exception('Error getting the steps data.')
-
+    def fetch(name):
+        """ Return path to downloaded file or None. """
+        tdir = tempfile.mkdtemp()
+        path = os.path.join(tdir, name)
+        try:
+            server.retrieve_to_path(name=name, path=path)
+        except Exception:
+            logger.exception('Error getting the steps data.')
+            shutil.rmtree(tdir)
+            return
+        return path
+
+    def extract(path):
+        """ Return region from downloaded path or None. """
+        try:
+            return extract_region(path=path, percentile=config.PERCENTILE)
+        except Exception:
+            logger.exception('Error getting the steps data.')
+        finally:
+            shutil.rmtree(os.path.dirname(path))
+
+    def rotate_region(region):
+        """ Rotate the stores using region. """
+        name = config.NAME
+        path = os.path.join(config.STORE_DIR, name)
+        rotate(path=path, region=region, resource=name)
+        return name
+
+    # download and process the file, then rotate the stores
+    pipeline = Pipeline(
+        Stage(name='fetch', func=fetch),
+        Stage(name='decode', func=extract),
+        Stage(name='rotate', func=rotate_region),
+    )
+    if not pipeline.run([latest]):
         return
 
-    # rotate the stores
-    name = config.NAME
-    path = os.path.join(config.STORE_DIR, name)
-    rotate(path=path, region=region, resource=name)
-
     # touch lizard
     for raster_uuid in config.TOUCH_LIZARD:
         touch_lizard(raster_uuid)
@@ -195,6 +205,7 @@ def main():
     """ Call command with args from parser. """
     # logging
     kwargs = vars(get_parser().parse_args())
+    setup()
     if kwargs.pop('verbose'):
         logging.basicConfig(**{
             'stream': sys.stderr,
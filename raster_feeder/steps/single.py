@@ -14,6 +14,7 @@ import logging
 from raster_store import stores
 
 from . import config
+from .. import setup
 from . import rotate
 
 logger = logging.getLogger(__name__)
@@ -87,6 +88,7 @@ def single(source_path, target_path, percentile):
 def main():
     """ Call command with args from parser. """
     kwargs = vars(get_parser().parse_args())
+    setup()
 
     # create logfile next to store
     logging_path = kwargs["target_path"] + ".log"
@@ -2,6 +2,8 @@
 # -*- coding: utf-8 -*-
 
 import os
+import subprocess
+import sys
 
 from unittest import mock
 from unittest import TestCase
@@ -9,6 +11,8 @@ from unittest import TestCase
 from pytest import mark
 
 from raster_feeder.common import FTPServer
+from raster_feeder.common import Pipeline
+from raster_feeder.common import Stage
 from raster_feeder.tests.common import TemporaryDirectory
 
 
@@ -83,3 +87,48 @@ class TestFTPServer(TestCase):
 
             with open(filepath, 'rb') as stream:
                 self.assertEqual(len(stream.read()), 1024)
+
+
+@mark.common
+class TestPipeline(TestCase):
+    def test_order(self):
+        pipeline = Pipeline(
+            Stage(name='double', func=lambda x: 2 * x),
+            Stage(name='str', func=str),
+        )
+        self.assertEqual(pipeline.run(range(5)), ['0', '2', '4', '6', '8'])
+
+    def test_drop_and_expand(self):
+        pipeline = Pipeline(
+            Stage(name='odd', func=lambda x: x if x % 2 else None),
+            Stage(name='repeat', func=lambda x: x * [x], expand=True),
+        )
+        self.assertEqual(pipeline.run(range(4)), [1, 3, 3, 3])
+
+    def test_timing(self):
+        stage = Stage(name='identity', func=lambda x: x)
+        Pipeline(stage).run(range(3))
+        self.assertEqual(stage.count, 3)
+        self.assertGreaterEqual(stage.elapsed, 0)
+
+    def test_error(self):
+        def fail(x):
+            raise ValueError(x)
+
+        pipeline = Pipeline(
+            Stage(name='fail', func=fail),
+            Stage(name='identity', func=lambda x: x),
+        )
+        with self.assertRaises(ValueError):
+            pipeline.run(range(10))
+
+
+class TestImports(TestCase):
+    def test_lazy(self):
+        """ Importing common does not import turn, redis or requests. """
+        code = (
+            'import sys; import raster_feeder.common; '
+            'print(sorted({"turn", "redis", "requests"} & set(sys.modules)))'
+        )
+        output = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual(output.decode().strip(), '[]')
@@ -0,0 +1,148 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from unittest import mock
+
+from raster_feeder.nrr import utils
+
+
+class TestDirectoryIndex(unittest.TestCase):
+    def test_getmtime(self):
+        with tempfile.TemporaryDirectory() as basedir:
+            helper = utils.PathHelper(basedir, 'c', '{code}_{timestamp}.h5')
+            dt = datetime(2011, 3, 5, 14, 15)
+            path = helper.path(dt)
+            os.makedirs(helper.directory(dt))
+            open(path, 'w').close()
+
+            index = utils.DirectoryIndex()
+            self.assertEqual(index.getmtime(path), os.path.getmtime(path))
+
+            # listed once, so later files are not seen
+            other = helper.path(datetime(2011, 3, 5, 14, 20))
+            open(other, 'w').close()
+            with self.assertRaises(OSError):
+                index.getmtime(other)
+
+            # missing directories are just empty
+            with self.assertRaises(OSError):
+                index.getmtime(helper.path(datetime(2011, 3, 6)))
+
+    def test_stat(self):
+        with tempfile.TemporaryDirectory() as basedir:
+            helper = utils.PathHelper(basedir, 'c', '{code}_{timestamp}.h5')
+            dt = datetime(2011, 3, 5, 14, 15)
+            path = helper.path(dt)
+            os.makedirs(helper.directory(dt))
+            with open(path, 'w') as f:
+                f.write('data')
+
+            # only files that are there and asked for are stat'ed, once
+            index = utils.DirectoryIndex()
+            with mock.patch('os.stat', wraps=os.stat) as stat:
+                with self.assertRaises(OSError):
+                    index.getsize(helper.path(datetime(2011, 3, 5, 14, 20)))
+                self.assertEqual(stat.call_count, 0)
+                self.assertEqual(index.getsize(path), 4)
+                index.getmtime(path)
+                self.assertEqual(stat.call_count, 1)
+                self.assertTrue(index.exists(path))
+                self.assertEqual(stat.call_count, 1)
+
+
+class TestGetRuns(unittest.TestCase):
+    def test_get_runs(self):
+        self.assertEqual(utils.get_runs([]), [])
+        self.assertEqual(utils.get_runs([0, 287]), [(0, 0), (287, 287)])
+        self.assertEqual(
+            utils.get_runs({4: None, 2: None, 3: None, 9: None}),
+            [(2, 4), (9, 9)],
+        )
+
+
+class TestMetaCache(unittest.TestCase):
+    def setUp(self):
+        self.dates = [datetime(2020, 1, 1, 23) + timedelta(hours=h)
+                      for h in range(4)]
+        self.group = mock.MagicMock()
+        self.group.get_meta.return_value = {self.dates[1]: '{}'}
+        self.cache = utils.MetaCache(size=2)
+
+    def get_meta(self):
+        return self.cache.get_meta(
+            name='hour', group=self.group, dates=self.dates,
+        )
+
+    def test_hit(self):
+        self.assertEqual(self.get_meta()[self.dates[1]], '{}')
+        self.assertEqual(self.get_meta()[self.dates[1]], '{}')
+        self.assertEqual(self.group.get_meta.call_count, 1)
+
+    def test_invalidate(self):
+        self.get_meta()
+        self.cache.invalidate('day', self.dates[0], self.dates[0])
+        self.get_meta()
+        self.assertEqual(self.group.get_meta.call_count, 1)
+
+        # the chunk spans two days, writing to the second one counts, too
+        self.cache.invalidate('hour', self.dates[-1], self.dates[-1])
+        self.get_meta()
+        self.assertEqual(self.group.get_meta.call_count, 2)
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'test.journal')
+        self.start = datetime(2020, 1, 1)
+        self.stop = datetime(2020, 1, 3)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_resume(self):
+        journal = utils.Journal(self.path)
+        journal.record(self.start, self.stop, journal.PLANNED)
+        journal.record(self.start, self.stop, journal.COPIED)
+
+        journal = utils.Journal(self.path)
+        self.assertTrue(journal)
+        self.assertEqual(journal.get(self.start, self.stop), journal.COPIED)
+
+        journal.record(self.start, self.stop, journal.DELETED)
+        journal = utils.Journal(self.path)
+        self.assertFalse(journal)
+        self.assertIsNone(journal.get(self.start, self.stop))
+
+    def test_fingerprint(self):
+        journal = utils.Journal(self.path)
+        journal.record(self.start, self.stop, journal.COPIED, fingerprint='a')
+        journal = utils.Journal(self.path)
+        self.assertEqual(journal.get_fingerprint(self.start, self.stop), 'a')
+
+        journal.record(self.start, self.stop, journal.DELETED)
+        self.assertIsNone(journal.get_fingerprint(self.start, self.stop))
+
+    def test_torn(self):
+        journal = utils.Journal(self.path)
+        journal.record(self.start, self.stop, journal.PLANNED)
+        with open(self.path, 'a') as f:
+            f.write('{"start": "2020')
+
+        journal = utils.Journal(self.path)
+        self.assertEqual(journal.get(self.start, self.stop), journal.PLANNED)
+        journal.record(self.start, self.stop, journal.COPIED)
+        journal = utils.Journal(self.path)
+        self.assertEqual(journal.get(self.start, self.stop), journal.COPIED)
+
+    def test_remove(self):
+        journal = utils.Journal(self.path)
+        journal.record(self.start, self.stop, journal.PLANNED)
+        journal.remove()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(journal)
@@ -0,0 +1,209 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from unittest import mock
+
+import netCDF4
+import numpy as np
+from osgeo import gdal
+
+from raster_feeder.nrr import export
+
+
+class FakeStore(object):
+    """ Store with random rain, with nodata at some frames and pixels. """
+    timedelta = timedelta(minutes=5)
+
+    def __init__(self, start, count):
+        random = np.random.RandomState(0)
+        shape = count, export.HEIGHT, export.WIDTH
+        self.datetimes = [start + timedelta(minutes=5 * i)
+                          for i in range(count)]
+        self.values = random.gamma(0.5, 2, size=shape).astype('f4')
+        self.values[random.rand(*shape) < 0.3] = export.NO_DATA_VALUE
+        self.values[:, :10] = export.NO_DATA_VALUE
+
+    def get_data(self, start, stop, **kwargs):
+        index = self.datetimes.index
+        values = self.values[index(start):index(stop) + 1]
+        return {'values': values, 'no_data_value': export.NO_DATA_VALUE}
+
+
+class TestRollingValues(unittest.TestCase):
+    def setUp(self):
+        self.store = FakeStore(start=datetime(2020, 6, 15), count=40)
+        self.limiter = export.RateLimiter(rate=None)
+
+    def check(self, size, step):
+        datetimes = self.store.datetimes
+        windows = [datetimes[i - size:i]
+                   for i in range(size, len(datetimes) + 1, step)]
+        rolling = export.get_rolling_values(
+            store=self.store, windows=windows, limiter=self.limiter,
+        )
+        for window, (datetimes, values) in zip(windows, rolling):
+            self.assertEqual(datetimes, window)
+            expected = export.get_values(store=self.store, datetimes=window)
+            np.testing.assert_array_equal(values, expected)
+
+    def test_overlapping(self):
+        self.check(size=12, step=1)
+        self.check(size=12, step=5)
+
+    def test_separate(self):
+        self.check(size=6, step=6)
+        self.check(size=6, step=8)
+
+    def test_nodata(self):
+        size = 12
+        window = self.store.datetimes[:size]
+        rolling = export.get_rolling_values(
+            store=self.store, windows=[window], limiter=self.limiter,
+        )
+        (_, values), = rolling
+        self.assertTrue((values[:, :10] == export.NO_DATA_VALUE).all())
+        self.assertTrue((values[:, 10:] >= 0).all())
+
+
+class WriterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = FakeStore(start=datetime(2020, 6, 15), count=12)
+        self.period = self.store.datetimes[0], self.store.datetimes[-1]
+
+    def get_writer(self, output, changed=False, size=1):
+        return export.WRITERS[output](
+            store=self.store,
+            product='5min/ultimate',
+            path=self.tmp.name,
+            period=self.period,
+            size=size,
+            changed=changed,
+        )
+
+
+class TestTIFFWriter(WriterTestCase):
+    def setUp(self):
+        super().setUp()
+        self.datetimes = self.store.datetimes[:1]
+        writer = self.get_writer('tif')
+        self.path = writer.get_path(self.datetimes)
+
+    def skip(self, changed, stored):
+        writer = self.get_writer('tif', changed=changed)
+        with mock.patch.object(writer, 'get_stored', return_value=stored):
+            skip = writer.skip(self.datetimes)
+        writer.close()
+        return skip
+
+    def test_legacy(self):
+        # a file exported before there was a manifest
+        os.makedirs(os.path.dirname(self.path))
+        open(self.path, 'w').close()
+        self.assertTrue(self.skip(changed=False, stored='2020-06-16'))
+        self.assertFalse(self.skip(changed=True, stored='2020-06-16'))
+        self.assertTrue(self.skip(changed=True, stored=None))
+
+    def test_changed(self):
+        writer = self.get_writer('tif')
+        values = export.get_values(store=self.store, datetimes=self.datetimes)
+        stored = '2020-06-16'
+        with mock.patch.object(writer, 'get_stored', return_value=stored):
+            writer.write(values=values, datetimes=self.datetimes)
+        writer.close()
+        self.assertTrue(self.skip(changed=True, stored='2020-06-16'))
+        self.assertFalse(self.skip(changed=True, stored='2020-06-17'))
+
+    def test_get_stored(self):
+        writer = self.get_writer('tif')
+        writer.META_FRAMES = 5
+        interface = mock.Mock()
+        interface.return_value.get_meta.return_value = {}
+        with mock.patch('raster_store.interfaces.GeoInterface', interface):
+            for datetime_ in self.store.datetimes:
+                self.assertIsNone(writer.get_stored([datetime_]))
+        # fetched in blocks, up to the end of the period
+        get_meta = interface.return_value.get_meta
+        self.assertEqual(get_meta.call_count, 3)
+        self.assertEqual(
+            get_meta.call_args[1]['stop'], self.period[1].isoformat(),
+        )
+
+    def test_skip(self):
+        # without changed, only the directory is looked at, once
+        writer = self.get_writer('tif')
+        with mock.patch.object(writer, 'get_stored') as get_stored, \
+                mock.patch('os.scandir', wraps=os.scandir) as scandir:
+            for datetime_ in self.store.datetimes:
+                self.assertFalse(writer.skip([datetime_]))
+        get_stored.assert_not_called()
+        self.assertEqual(scandir.call_count, 1)
+
+
+class TestCOGWriter(WriterTestCase):
+    def test_write(self):
+        datetimes = self.store.datetimes[:1]
+        values = export.get_values(store=self.store, datetimes=datetimes)
+        writer = self.get_writer('cog')
+        writer.write(values=values, datetimes=datetimes)
+        writer.close()
+
+        dataset = gdal.Open(writer.get_path(datetimes))
+        band = dataset.GetRasterBand(1)
+        np.testing.assert_array_equal(band.ReadAsArray(), values[0])
+        self.assertEqual(band.GetBlockSize(), [256, 256])
+        self.assertEqual(band.GetOverviewCount(), 3)
+        self.assertEqual(band.GetOverview(0).XSize, export.WIDTH // 2)
+        structure = dataset.GetMetadata('IMAGE_STRUCTURE')
+        self.assertEqual(structure['COMPRESSION'], 'DEFLATE')
+
+
+class TestNetCDFWriter(WriterTestCase):
+    def test_write(self):
+        size = 4
+        datetimes = self.store.datetimes
+        windows = [datetimes[i:i + size]
+                   for i in range(0, len(datetimes), size)]
+        writer = self.get_writer('netcdf', size=size)
+        for window in windows:
+            values = export.get_values(store=self.store, datetimes=window)
+            writer.write(values=values, datetimes=window)
+
+        # the final name appears only once all windows are in
+        self.assertTrue(os.path.exists(writer.part_path))
+        self.assertFalse(os.path.exists(writer.nc_path))
+        writer.close()
+        self.assertFalse(os.path.exists(writer.part_path))
+        self.assertTrue(self.get_writer('netcdf').skip(windows[0]))
+
+        with netCDF4.Dataset(writer.nc_path) as nc:
+            time = nc['time']
+            self.assertEqual(
+                list(netCDF4.num2date(time[:], time.units)),
+                [window[-1] for window in windows],
+            )
+            bounds = netCDF4.num2date(nc['time_bnds'][:], time.units)
+            self.assertEqual(bounds[0].tolist(), [windows[0][0],
+                                                  windows[0][-1]])
+            self.assertEqual(nc.aggregation_size, size)
+            values = export.get_values(store=self.store, datetimes=windows[1])
+            np.testing.assert_array_equal(
+                nc['precipitation'][1].filled(export.NO_DATA_VALUE),
+                values[0],
+            )
+
+
+class TestMain(unittest.TestCase):
+    def test_changed_netcdf(self):
+        argv = ['nrr-export', '5min/ultimate', '202006150000', 'destination',
+                '--output', 'netcdf', '--changed']
+        with mock.patch('sys.argv', argv):
+            with mock.patch('sys.stderr'):
+                with self.assertRaises(SystemExit):
+                    export.main()
@@ -0,0 +1,92 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from unittest import mock
+
+from raster_feeder.nrr import move
+from raster_feeder.nrr import utils
+
+
+class TestMoveChunk(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'test.journal')
+
+        start = datetime(2020, 6, 15)
+        step = timedelta(minutes=5)
+        self.datetimes = [start + i * step for i in range(12)]
+        self.source = mock.Mock(period=(start, self.datetimes[-1]))
+        self.target = mock.Mock(
+            period=(start, self.datetimes[-1]),
+            timeorigin=datetime(2000, 1, 1),
+            timedelta=step,
+            max_depth=288,
+        )
+
+        # the last bands of the chunk hold no data
+        self.metas = {d: json.dumps({'stored': '2020-06-15T12:00:00'})
+                      for d in self.datetimes[:-2]}
+        self.metas[self.datetimes[-1]] = None
+        interface = mock.Mock()
+        interface.return_value.get_meta.side_effect = lambda **kw: self.metas
+        patches = [
+            mock.patch.object(move, 'GeoInterface', interface),
+            mock.patch.object(move, 'load', return_value=self.target),
+            mock.patch.object(utils, 'get_meta_cache'),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def move(self, journal):
+        move.move_target_chunk_equivalent(
+            source=self.source,
+            target=self.target,
+            time_name='5min',
+            journal=journal,
+        )
+
+    def interrupt(self):
+        """ Move a chunk, dying before the source is deleted. """
+        journal = utils.Journal(self.path)
+        self.source.delete.side_effect = KeyboardInterrupt
+        with self.assertRaises(KeyboardInterrupt):
+            self.move(journal)
+        self.source.delete.side_effect = None
+        self.target.update.reset_mock()
+        return utils.Journal(self.path)
+
+    def test_move(self):
+        journal = utils.Journal(self.path)
+        self.move(journal)
+        self.target.update.assert_called_once()
+        self.source.delete.assert_called_once()
+        self.assertFalse(utils.Journal(self.path))
+
+    def test_settled(self):
+        # the target does not reach stop, but holds the copied bands
+        self.target.period = self.datetimes[0], self.datetimes[-3]
+        with mock.patch.object(move.time, 'sleep') as sleep:
+            self.move(utils.Journal(self.path))
+        sleep.assert_not_called()
+
+    def test_resume(self):
+        journal = self.interrupt()
+        self.move(journal)
+        self.target.update.assert_not_called()
+        self.source.delete.assert_called()
+
+    def test_resume_changed(self):
+        journal = self.interrupt()
+        self.metas[self.datetimes[0]] = json.dumps(
+            {'stored': '2020-06-15T13:00:00'},
+        )
+        self.move(journal)
+        self.target.update.assert_called_once()
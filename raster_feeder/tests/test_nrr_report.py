@@ -0,0 +1,50 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+
+import datetime
+import itertools
+import unittest
+
+import numpy as np
+
+from raster_feeder.nrr import report
+
+
+class TestChecker(unittest.TestCase):
+    def test_check_columns(self):
+        """ Columnar checks give the same messages as per meta checks. """
+        now = datetime.datetime.utcnow().replace(second=0, microsecond=0)
+        now -= datetime.timedelta(minutes=now.minute % 5)
+        times = np.array(
+            [now - datetime.timedelta(minutes=5 * i) for i in range(0, 12000)],
+            dtype='M8[us]',
+        )[::-1]
+
+        # all combinations of prodcodes, calibrations and counts
+        fields = itertools.product(
+            ('', 'r', 'n', 'a', 'u'),
+            (report.RAW, report.IDW, report.KED, 'other', None),
+            (1, 2, None),
+        )
+        metas = {}
+        for time, (prodcode, cal_method, count) in zip(
+                times.astype(datetime.datetime), itertools.cycle(fields)):
+            meta = {}
+            if prodcode:
+                meta['prodcode'] = prodcode
+            if cal_method is not None:
+                meta['cal_method'] = cal_method
+            if count is not None:
+                meta['composite_count'] = count
+            metas[time] = meta
+        columns = report.Columns(times=times, metas=metas)
+
+        for quality in (False, True):
+            checker = report.Checker(quality)
+            expected = []
+            for index, time in enumerate(times.astype(datetime.datetime)):
+                message = checker.check(meta=metas[time], date=time)
+                if message:
+                    expected.append((index, message))
+            self.assertTrue(expected)
+            self.assertEqual(checker.check_columns(columns), expected)
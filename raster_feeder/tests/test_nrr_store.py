@@ -0,0 +1,204 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+
+import contextlib
+import types
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from unittest import mock
+
+import numpy as np
+
+from raster_feeder.nrr import store
+from raster_feeder.nrr import utils
+
+BAND_BYTES = store.SHAPE[0] * store.SHAPE[1] * 4
+
+
+class FakeStore(object):
+    """ Store with hour chunks that records its updates. """
+    timeorigin = datetime(2000, 1, 1)
+    timedelta = timedelta(minutes=5)
+    max_depth = 12
+    dtype = 'f4'
+
+    def __init__(self):
+        self.updates = []
+
+    def update(self, regions):
+        self.updates.append(regions)
+
+
+class FakeMetaCache(object):
+    """ Meta cache of an empty group. """
+    def get_meta(self, name, group, dates):
+        return {}
+
+    def invalidate(self, name, start, stop):
+        pass
+
+
+class FakeLocker(object):
+    """ Locker that counts its locks. """
+    def __init__(self):
+        self.locks = 0
+
+    @contextlib.contextmanager
+    def lock(self, resource, label):
+        self.locks += 1
+        yield
+
+
+def create_region(data, meta, time, **kwargs):
+    return types.SimpleNamespace(
+        box=types.SimpleNamespace(data=data), meta=meta, time=time,
+    )
+
+
+class StoreTestCase(unittest.TestCase):
+    """ Store 5min ultimate products into a fake store. """
+    def setUp(self):
+        self.clock = 0
+        self.fake_store = FakeStore()
+        self.missing = set()
+        start = datetime(2020, 6, 15)
+        self.datetimes = [start + timedelta(minutes=5 * i)
+                          for i in range(6 * FakeStore.max_depth)]
+
+        regions = mock.Mock()
+        regions.Region.from_mem = create_region
+        patches = [
+            mock.patch.object(store, 'load', return_value=self.fake_store),
+            mock.patch.object(store, 'GeoInterface'),
+            mock.patch.object(store, 'regions', regions),
+            mock.patch.object(store, 'time', types.SimpleNamespace(
+                monotonic=lambda: self.clock,
+            )),
+            mock.patch.object(store, 'get_mtime', self.get_mtime),
+            mock.patch.object(store, 'get_size', return_value=1000),
+            mock.patch.object(store, 'fetch_contents', self.fetch_contents),
+            mock.patch.object(utils, 'MtimeCache'),
+            mock.patch.object(utils, 'get_meta_cache',
+                              return_value=FakeMetaCache()),
+            mock.patch.object(utils, 'get_wkt', return_value='WKT'),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_mtime(self, path, index=None):
+        if path in self.missing:
+            raise OSError
+        return '2020-06-15T12:00:00'
+
+    def fetch_contents(self, path, out):
+        """ Reading a product takes a second. """
+        self.clock += 1
+        out[:] = 1
+        return {}
+
+    def set_missing(self, datetimes):
+        helper = store.get_path_helper('f', 'u')
+        self.missing = {helper.path(d) for d in datetimes}
+
+    def store(self, **kwargs):
+        """ Store the datetimes and return the number of locks taken. """
+        locker = FakeLocker()
+        store.store_datetimes(
+            locker=locker,
+            timeframe='f',
+            prodcode='u',
+            datetimes=self.datetimes,
+            scan=False,
+            **kwargs
+        )
+        return locker.locks
+
+    def plan(self, **kwargs):
+        return store.plan_timeframe(
+            timeframe='f',
+            period=self.datetimes,
+            delivery=False,
+            prodcodes='u',
+            scan=False,
+            **kwargs
+        )['u']
+
+
+class TestPlan(StoreTestCase):
+    def check(self, batch_bytes):
+        plan = self.plan(batch_bytes=batch_bytes)
+        locks = self.store(batch_bytes=batch_bytes, batch_seconds=3600)
+
+        updates = self.fake_store.updates
+        regions = [r for update in updates for r in update]
+        bands = sum(len(r.time) for r in regions)
+        staged = sum(1 for r in regions for m in r.meta if m is not None)
+        self.assertEqual(plan['updates'], len(updates))
+        self.assertEqual(plan['locks'], locks)
+        self.assertEqual(plan['regions'], len(regions))
+        self.assertEqual(plan['bands'], bands)
+        self.assertEqual(plan['products'], staged)
+        self.assertEqual(plan['written'], bands * BAND_BYTES)
+        self.assertEqual(plan['read'], staged * 1000)
+
+    def test_single(self):
+        self.check(batch_bytes=1 << 40)
+
+    def test_batches(self):
+        self.check(batch_bytes=3 * FakeStore.max_depth * BAND_BYTES)
+        self.assertEqual(len(self.fake_store.updates), 2)
+
+    def test_missing(self):
+        # products missing at the end of a chunk and in its middle
+        self.set_missing(self.datetimes[10:14] + self.datetimes[30:31])
+        self.check(batch_bytes=2 * FakeStore.max_depth * BAND_BYTES)
+        for update in self.fake_store.updates:
+            data = np.concatenate([r.box.data for r in update])
+            self.assertTrue((data == 1).all())
+
+
+class TestBatch(StoreTestCase):
+    def get_sizes(self):
+        """ Return list of the number of bands per update. """
+        return [sum(len(r.time) for r in update)
+                for update in self.fake_store.updates]
+
+    def test_bytes(self):
+        # flush once three chunks are pending
+        batch_bytes = 3 * FakeStore.max_depth * BAND_BYTES
+        locks = self.store(batch_bytes=batch_bytes, batch_seconds=3600)
+        self.assertEqual(self.get_sizes(), [36, 36])
+        self.assertEqual(locks, 2)
+
+    def test_seconds(self):
+        # a chunk takes 12 seconds to read, flush once 30 have passed
+        locks = self.store(batch_bytes=1 << 40, batch_seconds=30)
+        self.assertEqual(self.get_sizes(), [36, 36])
+        self.assertEqual(locks, 2)
+
+    def test_both(self):
+        # whichever budget is exceeded first
+        batch_bytes = 2 * FakeStore.max_depth * BAND_BYTES
+        self.store(batch_bytes=batch_bytes, batch_seconds=30)
+        self.assertEqual(self.get_sizes(), [24, 24, 24])
+        self.fake_store.updates = []
+        self.store(batch_bytes=4 * batch_bytes, batch_seconds=20)
+        self.assertEqual(self.get_sizes(), [24, 24, 24])
+
+    def test_pending(self):
+        # nothing to store, nothing written
+        self.set_missing(self.datetimes)
+        locks = self.store(batch_bytes=1, batch_seconds=0)
+        self.assertEqual(self.fake_store.updates, [])
+        self.assertEqual(locks, 1)
+
+    def test_newest_first(self):
+        # each chunk is written on its own, the newest first
+        locks = self.store(batch_bytes=1 << 40, batch_seconds=3600,
+                           newest_first=True)
+        self.assertEqual(self.get_sizes(), 6 * [12])
+        self.assertEqual(locks, 6)
+        newest = self.fake_store.updates[0][0].time[-1]
+        self.assertEqual(newest, self.datetimes[-1])
@@ -0,0 +1,126 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+
+import os
+import pathlib
+import tempfile
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from unittest import mock
+
+from raster_feeder.nrr import config
+from raster_feeder.nrr import store
+from raster_feeder.nrr import watch
+
+
+class WatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        basedir = pathlib.Path(self.tmp.name)
+        for name in ('CALIBRATE_DIR', 'CONSISTENT_DIR'):
+            patcher = mock.patch.object(config, name, basedir / name)
+            patcher.start()
+            os.mkdir(str(basedir / name))
+            self.addCleanup(patcher.stop)
+        self.now = datetime(2020, 6, 15, 12, 5)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def create(self, timeframe, prodcode, datetime):
+        """ Create product file and return its path. """
+        path = store.get_path_helper(timeframe, prodcode).path(datetime)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'w').close()
+        return path
+
+
+class TestParsePath(WatchTestCase):
+    def test_product(self):
+        helper = store.get_path_helper('h', 'n')
+        path = helper.path(self.now)
+        self.assertEqual(watch.parse_path(path), ('h', 'n', self.now))
+
+    def test_other(self):
+        path = store.get_path_helper('h', 'n').path(self.now)
+        directory, name = os.path.split(path)
+
+        # wrong location, timestamp or name
+        self.assertIsNone(watch.parse_path(os.path.join('elsewhere', name)))
+        self.assertIsNone(watch.parse_path(path.replace('2020', '2o20')))
+        self.assertIsNone(watch.parse_path(path + '.tmp'))
+        self.assertIsNone(watch.parse_path(os.path.join(directory, 'x.h5')))
+
+
+class TestWatcher(WatchTestCase):
+    def setUp(self):
+        super().setUp()
+        try:
+            self.watcher = watch.Watcher(clock=lambda: self.now)
+        except (AttributeError, OSError):
+            self.skipTest('No inotify.')
+        self.addCleanup(self.watcher.inotify.close)
+
+    def drain(self):
+        """ Return set of paths read from pending events. """
+        result = set()
+        for _ in range(10):
+            paths, overflow = self.watcher.read(timeout=0.05)
+            self.assertFalse(overflow)
+            result.update(paths)
+        return result
+
+    def test_windows(self):
+        recent = self.now - timedelta(days=10)
+        old = self.now - timedelta(days=40)
+        realtime = store.get_path_helper('f', 'r')
+        ultimate = store.get_path_helper('f', 'u')
+        for helper in realtime, ultimate:
+            for datetime_ in self.now, recent, old:
+                os.makedirs(helper.directory(datetime_), exist_ok=True)
+        self.watcher.refresh()
+
+        self.assertIn(realtime.directory(self.now), self.watcher.watches)
+        self.assertNotIn(realtime.directory(recent), self.watcher.watches)
+        self.assertIn(ultimate.directory(recent), self.watcher.watches)
+        self.assertNotIn(ultimate.directory(old), self.watcher.watches)
+
+    def test_read(self):
+        # directories are created as products arrive
+        recent = self.now - timedelta(days=10)
+        old = self.now - timedelta(days=40)
+        path = self.create('f', 'u', recent)
+        self.create('f', 'u', old)
+        self.assertEqual(self.drain(), {path})
+
+        # once watched, files are reported by themselves
+        other = self.create('f', 'u', recent + timedelta(minutes=5))
+        self.assertEqual(self.drain(), {other})
+
+    def test_refresh(self):
+        self.create('f', 'r', self.now)
+        self.drain()
+        directory = store.get_path_helper('f', 'r').directory(self.now)
+        self.assertIn(directory, self.watcher.watches)
+
+        self.watcher.refresh(now=self.now + timedelta(days=60))
+        self.assertNotIn(directory, self.watcher.watches)
+        self.assertEqual(
+            len(self.watcher.inotify.paths), len(self.watcher.watches),
+        )
+
+
+class TestCommand(unittest.TestCase):
+    def test_scan(self):
+        # no events arrive, as on network shares
+        watcher = mock.Mock()
+        watcher.read.side_effect = [([], False), ([], False), SystemExit]
+        watcher.refresh.return_value = []
+        with mock.patch.object(watch, 'Watcher', return_value=watcher), \
+                mock.patch.object(watch, 'turn'), \
+                mock.patch.object(watch, 'scan') as scan:
+            with self.assertRaises(SystemExit):
+                watch.command(wait=0, text='3h', interval=0, threads=1)
+        # on startup and for every interval without events
+        self.assertEqual(scan.call_count, 3)
@@ -0,0 +1,129 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from raster_feeder.scheduler import CONTEXT
+from raster_feeder.scheduler import Job
+from raster_feeder.scheduler import get_preload
+from raster_feeder.scheduler import resolve
+
+EVENT = threading.Event()
+CALLS = []
+PID = os.getpid()  # of the process that imported this module
+
+
+def setUpModule():
+    # before the first isolated job starts the server process
+    CONTEXT.set_forkserver_preload([__name__])
+
+
+def work(value):
+    CALLS.append(value)
+    EVENT.wait(5)
+
+
+def spawn(path):
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        value = executor.submit(abs, -1).result()
+    with open(path, 'w') as f:
+        f.write(str(value))
+
+
+def nap(seconds):
+    time.sleep(seconds)
+
+
+def report(path):
+    with open(path, 'w') as f:
+        f.write(str(PID == os.getpid()))
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        CALLS.clear()
+        EVENT.clear()
+
+    def tearDown(self):
+        EVENT.set()
+
+    def test_resolve(self):
+        self.assertIs(resolve('raster_feeder.scheduler:resolve'), resolve)
+
+    def test_get_preload(self):
+        jobs = [Job(name=name,
+                    target='raster_feeder.tests.test_scheduler:' + name,
+                    interval=60,
+                    isolate=isolate) for name, isolate in (('work', False),
+                                                           ('nap', True))]
+        names = get_preload(jobs)
+        self.assertIn('raster_feeder', names)
+        self.assertIn('raster_store.cache', names)
+        self.assertIn('raster_feeder.tests.test_scheduler', names)
+
+    def test_overlap(self):
+        job = Job(
+            name='work',
+            target='raster_feeder.tests.test_scheduler:work',
+            kwargs={'value': 1},
+            interval=60,
+        )
+        due = job.due
+        job.start()
+        job.start()  # still running, so skipped
+        EVENT.set()
+        job.join()
+        self.assertEqual(CALLS, [1])
+        self.assertEqual(job.due, due + 120)
+
+    def test_isolate(self):
+        """ Isolated jobs can start worker processes themselves. """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'result')
+            job = Job(
+                name='spawn',
+                target='raster_feeder.tests.test_scheduler:spawn',
+                kwargs={'path': path},
+                interval=60,
+                isolate=True,
+            )
+            job.start()
+            job.join()
+            self.assertEqual(job.worker.exitcode, 0)
+            with open(path) as f:
+                self.assertEqual(f.read(), '1')
+
+    def test_preload(self):
+        """ Isolated jobs do not import their module on every run. """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'result')
+            job = Job(
+                name='report',
+                target='raster_feeder.tests.test_scheduler:report',
+                kwargs={'path': path},
+                interval=60,
+                isolate=True,
+            )
+            job.start()
+            job.join()
+            with open(path) as f:
+                self.assertEqual(f.read(), 'False')
+
+    def test_stop(self):
+        job = Job(
+            name='nap',
+            target='raster_feeder.tests.test_scheduler:nap',
+            kwargs={'seconds': 60},
+            interval=60,
+            isolate=True,
+        )
+        job.start()
+        time.sleep(1)
+        self.assertTrue(job.running())
+        job.stop()
+        self.assertFalse(job.running())
@@ -11,6 +11,7 @@ import sys
 
 from . import common
 from . import config
+from . import setup
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +35,7 @@ def get_parser():
 def main():
     # logging
     kwargs = vars(get_parser().parse_args())
+    setup(stores=False)
     if kwargs['verbose']:
         logging.basicConfig(**{
             'stream': sys.stderr,
@@ -49,12 +49,14 @@ setup(name='raster_feeder',
           'console_scripts': [
               # COMMON
               'info = raster_feeder.info:main',
+              'raster-feeder-scheduler = raster_feeder.scheduler:main',
               # NRR
               'nrr-init = raster_feeder.nrr.init:main',
               'nrr-merge = raster_feeder.nrr.merge:main',
               'nrr-move = raster_feeder.nrr.move:main',
               'nrr-report = raster_feeder.nrr.report:main',
               'nrr-store = raster_feeder.nrr.store:main',
+              'nrr-watch = raster_feeder.nrr.watch:main',
               'nrr-export = raster_feeder.nrr.export:main',
               # NOWCAST
               'nowcast-init = raster_feeder.nowcast.init:main',